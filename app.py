@@ -1,16 +1,46 @@
+import io
+import json
+import logging
 import os
 import secrets
-import qrcode
+import sqlite3
+import threading
+import time
+import zipfile
+import click
 
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import wraps
+from urllib.parse import urlsplit
 from flask import (
-    Flask, render_template, request,
-    redirect, url_for, jsonify
+    Flask, render_template, request, make_response,
+    redirect, url_for, jsonify, session, send_file, send_from_directory,
+    Response, stream_with_context, g, has_app_context, has_request_context
 )
+from flask.cli import AppGroup
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload, selectinload
 from flask_mail import Mail, Message
+from flask_wtf.csrf import CSRFProtect, CSRFError
 from dotenv import load_dotenv
 
+from reconcile import iter_statement_rows, iter_statement_lines, reconcile
+from search import (
+    setup_search_index, rebuild_search_index, drop_search_triggers, search_order_ids
+)
+from exports import iter_csv, iter_xlsx
+from migrations import Migrations
+from metrics import Registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from tracing import make_tracer
+from pagecache import Versions, PageCache, Availability, SoldOut
+from assets import SUFFIXES as ASSET_SUFFIXES, brotli, build as build_assets, load_manifest
+from posters import POSTER_DIR, load_poster, remove_poster, render_poster
+import synthetic
+
 # ================== LOAD ENV ==================
 # Reads values from .env into environment variables in development
 load_dotenv()
@@ -20,8 +50,27 @@ load_dotenv()
 app = Flask(__name__)
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'tickets.db')
+def normalize_database_url(url):
+    # Heroku/Render hand out postgres://, which SQLAlchemy no longer accepts
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+app.config['SQLALCHEMY_DATABASE_URI'] = normalize_database_url(
+    os.environ.get('DATABASE_URL') or 'sqlite:///' + os.path.join(basedir, 'tickets.db')
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Without SECRET_KEY each process signs cookies with its own random key, so a
+# session cannot be forged, but none survives a restart or reaches another
+# worker; admin password login is refused until one is set.
+SECRET_KEY_SET = bool(os.environ.get('SECRET_KEY'))
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
+# Admin forms carry a CSRF token (valid for the session) and the session
+# cookie is not sent on cross-site POSTs. The public forms are exempt: they
+# act on nothing a cookie grants, so a forged one could just as well be sent directly.
+app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+app.config['WTF_CSRF_TIME_LIMIT'] = None
+csrf = CSRFProtect()  # registered after the instrumentation hooks, which time rejections too
 
 # ---------- EMAIL CONFIG ----------
 app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -39,8 +88,176 @@ mail = Mail(app)
 MANUAL_PAYBILL_NUMBER = os.environ.get("MANUAL_PAYBILL_NUMBER", "522533")
 MANUAL_PAY_NAME = os.environ.get("MANUAL_PAY_NAME", "Mtwapa Greenyard Resort")
 ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "set-a-secure-token")
+ADMIN_USERNAME = os.environ.get("ADMIN_USERNAME", "admin")
+ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD")
+ADMIN_PAGE_SIZE = int(os.environ.get("ADMIN_PAGE_SIZE", 50))
+RECONCILE_BATCH_SIZE = int(os.environ.get("RECONCILE_BATCH_SIZE", 500))
+RECONCILE_PREVIEW_ROWS = 200
+SEARCH_RESULT_LIMIT = 50
+EXPORT_YIELD_PER = 1000
+
+# ---------- SQLITE CONFIG ----------
+# Applied to every new SQLite connection. WAL lets readers keep going while
+# buy() commits; busy_timeout makes concurrent writers wait instead of failing
+# with "database is locked". SQLITE_PROFILE=off leaves SQLite's defaults.
+SQLITE_PROFILE = os.environ.get("SQLITE_PROFILE", "production")
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    'synchronous': os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    'busy_timeout': int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    'cache_size': int(os.environ.get("SQLITE_CACHE_SIZE", -20000)),  # negative = KiB
+    'mmap_size': int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    'temp_store': os.environ.get("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if SQLITE_PROFILE == 'off' or not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+# ---------- POSTGRES CONFIG ----------
+# Per-worker pool: size it so workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays
+# under the server's max_connections.
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get("DB_POOL_SIZE", 5)),
+        'max_overflow': int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        'pool_timeout': int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        'pool_recycle': int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        'pool_pre_ping': True,
+        'connect_args': {
+            'connect_timeout': int(os.environ.get("DB_CONNECT_TIMEOUT", 5)),
+            'application_name': 'poolparty-tickets',
+            'options': f"-c statement_timeout={int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 15000))}",
+        },
+    }
+
+# ---------- READ ROUTING ----------
+# Views marked @read_only query the 'read' bind: DATABASE_READ_URL (a replica)
+# if set, otherwise a separate read-only pool on the primary so public pages
+# never queue behind checkout for a connection. A visitor who just placed an
+# order reads from the primary for READ_YOUR_WRITES_SECONDS.
+DB_READ_ROUTING = os.environ.get("DB_READ_ROUTING", "on") == "on"
+READ_YOUR_WRITES_SECONDS = int(os.environ.get("READ_YOUR_WRITES_SECONDS", 10))
+
+if DB_READ_ROUTING:
+    read_bind = {'url': normalize_database_url(
+        os.environ.get('DATABASE_READ_URL') or app.config['SQLALCHEMY_DATABASE_URI']
+    )}
+    if read_bind['url'].startswith('postgresql'):
+        read_bind.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        connect_args = dict(read_bind.get('connect_args', {}))
+        connect_args['options'] = (connect_args.get('options', '') +
+                                   ' -c default_transaction_read_only=on').strip()
+        read_bind['connect_args'] = connect_args
+    app.config['SQLALCHEMY_BINDS'] = {'read': read_bind}
+
+# ---------- QUERY STATS CONFIG ----------
+# Per-request SQL statement count and DB time, reported in a Server-Timing
+# header and one JSON log line per request. Statements slower than
+# SLOW_QUERY_MS are logged with their route. Views marked @query_budget(n)
+# warn past n statements; QUERY_BUDGET_STRICT=on (tests, CI) makes it a 500.
+QUERY_STATS = os.environ.get("QUERY_STATS", "on") == "on"
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 100))
+QUERY_BUDGET_STRICT = os.environ.get("QUERY_BUDGET_STRICT", "off") == "on"
+
+query_log = logging.getLogger('tickets.queries')
+query_log.setLevel(os.environ.get("QUERY_LOG_LEVEL", "INFO"))
+if not logging.getLogger().handlers:
+    query_log.addHandler(logging.StreamHandler())
+
+# ---------- METRICS CONFIG ----------
+# /metrics serves Prometheus text format to admins, or to scrapers sending
+# "Authorization: Bearer $METRICS_TOKEN". Values are per worker process.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+metrics = Registry()
+REQUEST_SECONDS = metrics.histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint.', ('endpoint', 'method'))
+REQUESTS = metrics.counter(
+    'http_requests_total', 'Finished requests by endpoint and status.', ('endpoint', 'method', 'status'))
+IN_FLIGHT = metrics.gauge('http_requests_in_flight', 'Requests being served.', ('endpoint',))
+QR_RENDER_SECONDS = metrics.histogram(
+    'qr_render_seconds', 'Time to render and save one ticket QR code.',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+EMAIL_OUTBOX = metrics.gauge('email_outbox_depth', 'Ticket emails built or being sent right now.')
+EMAIL_SEND_SECONDS = metrics.histogram('email_send_seconds', 'Time to build and send one ticket email.')
+EMAIL_FAILURES = metrics.counter('email_send_failures_total', 'Ticket emails that raised while sending.')
+
+# ---------- TRACING CONFIG ----------
+# Spans cover each request and ticket issuing down to QR render, PNG save,
+# commit and mail.send. TRACE_EXPORTER=file (default) appends whole traces
+# slower than TRACE_MIN_MS to TRACE_FILE as JSON lines, keeping the first
+# TRACE_MAX_SPANS spans of each; otel hands spans to OpenTelemetry; off
+# disables tracing.
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "file")
+TRACE_FILE = os.environ.get("TRACE_FILE", os.path.join(basedir, 'traces.jsonl'))
+TRACE_MIN_MS = float(os.environ.get("TRACE_MIN_MS", 250))
+TRACE_MAX_SPANS = int(os.environ.get("TRACE_MAX_SPANS", 1000))
+tracer = make_tracer(TRACE_EXPORTER, path=TRACE_FILE, min_ms=TRACE_MIN_MS,
+                     service='poolparty-tickets', max_spans=TRACE_MAX_SPANS)
+
+# ---------- PAGE CACHE CONFIG ----------
+# The events landing page is rendered once per catalogue version, bumped in
+# the same transaction as any change to an Event (including a new poster),
+# and served from memory with an ETag so returning visitors get a 304.
+# Workers re-read the versions at most every DATA_VERSION_CHECK_SECONDS;
+# PAGE_CACHE=off renders on every request.
+PAGE_CACHE = os.environ.get("PAGE_CACHE", "on") == "on"
+DATA_VERSION_CHECK_SECONDS = float(os.environ.get("DATA_VERSION_CHECK_SECONDS", 2))
+PAGE_CACHE_REQUESTS = metrics.counter(
+    'page_cache_requests_total', 'Cached page lookups by page and result.', ('page', 'result'))
+
+# Tickets left per tier, shown on the buy page and by /api/availability/<id>,
+# come from a per-event cache at most AVAILABILITY_MAX_AGE seconds old (0
+# reads the database every time), dropped when the event or its tiers are
+# edited. Purchases still check the database.
+AVAILABILITY_MAX_AGE = float(os.environ.get("AVAILABILITY_MAX_AGE", 5))
+# Selling a tier's last ticket flags it sold out on every worker; buy() then
+# turns it away, and the buy page hides it, before any database work.
+SOLD_OUT_REJECTIONS = metrics.counter(
+    'sold_out_rejections_total', 'Purchases turned away by the sold-out flag.', ('ticket_type_id',))
+
+# ---------- STATIC ASSETS CONFIG ----------
+# After `flask build-assets` (see assets.py) url_for('static', ...) links to
+# content-hashed copies, served with a year-long immutable Cache-Control and
+# as brotli or gzip when the client accepts it. Without a build, or with
+# STATIC_ASSETS=off, static files keep their plain names and revalidate.
+STATIC_MANIFEST = load_manifest(app.static_folder) if os.environ.get("STATIC_ASSETS", "on") == "on" else {}
+HASHED_ASSETS = {entry['path']: entry for entry in STATIC_MANIFEST.values()}
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# The build also renders the landing-page poster at several widths as
+# AVIF/WebP/JPEG (see posters.py) for a <picture> srcset.
+DEFAULT_POSTER = 'images/poolparty.jpg'
+DEFAULT_POSTER_KEY = 'default'
+POSTER_EXTENSIONS = ('.avif', '.webp', '.jpg')
+# Posters uploaded from /admin/events/<id> are rendered the same way on
+# upload; the original is kept in instance/posters for later builds.
+POSTER_MAX_BYTES = int(os.environ.get("POSTER_MAX_BYTES", 15 * 1024 * 1024))
+
+class RoutingSession(FlaskSession):
+    """Sends queries from read-only views to the 'read' bind; flushes always go to the primary."""
 
-db = SQLAlchemy(app)
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('read_only'):
+            engines = self._db.engines
+            if 'read' in engines:
+                return engines['read']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+
+def apply_read_only_pragma(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.execute("PRAGMA query_only=ON")
+
+with app.app_context():
+    if 'read' in db.engines:
+        event.listen(db.engines['read'], 'connect', apply_read_only_pragma)
 
 # ensure QR folder exists
 os.makedirs(os.path.join(basedir, 'static', 'qrs'), exist_ok=True)
@@ -54,6 +271,7 @@ class Event(db.Model):
     location = db.Column(db.String(150), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
+    poster = db.Column(db.String(20), nullable=True)  # content hash of the uploaded poster
     ticket_types = db.relationship('TicketType', backref='event', lazy=True)
 
 class TicketType(db.Model):
@@ -71,43 +289,346 @@ class Order(db.Model):
     buyer_phone = db.Column(db.String(20), nullable=False)
     payment_method = db.Column(db.String(50), nullable=False)  # 'mpesa_manual'
     payment_status = db.Column(db.String(20), default='pending')  # 'pending','paid','failed'
-    mpesa_code = db.Column(db.String(40), nullable=True)
+    mpesa_code = db.Column(db.String(40), nullable=True, index=True)
     amount = db.Column(db.Integer, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # saved so we can create tickets AFTER payment confirmed
-    ticket_type_id = db.Column(db.Integer, nullable=True)
+    ticket_type_id = db.Column(db.Integer, db.ForeignKey('ticket_type.id'), nullable=True)
     quantity = db.Column(db.Integer, nullable=True)
     stripe_session_id = db.Column(db.String(255), nullable=True)
     mpesa_checkout_request_id = db.Column(db.String(255), nullable=True)
 
     tickets = db.relationship('Ticket', backref='order', lazy=True)
+    ticket_type = db.relationship('TicketType')
+
+    # admin list pages newest-first on (created_at, id), optionally filtered
+    __table_args__ = (
+        db.Index('ix_order_created_id', 'created_at', 'id'),
+        db.Index('ix_order_status_created_id', 'payment_status', 'created_at', 'id'),
+        db.Index('ix_order_tier_created_id', 'ticket_type_id', 'created_at', 'id'),
+    )
 
 class Ticket(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     ticket_type_id = db.Column(db.Integer, db.ForeignKey('ticket_type.id'), nullable=False)
     code = db.Column(db.String(50), unique=True, nullable=False)
     status = db.Column(db.String(20), default='valid')  # 'valid','used'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    used_at = db.Column(db.DateTime, nullable=True)  # checked in at the gate
     qr_path = db.Column(db.String(200))
     ticket_type = db.relationship('TicketType', backref=db.backref('tickets', lazy=True))
 
+class SalesSummary(db.Model):
+    """Running totals per (event, tier, order day, payment status).
+
+    Updated in the same transaction as every order write, so dashboards read
+    a handful of rows instead of scanning order and ticket.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=False)
+    ticket_type_id = db.Column(db.Integer, db.ForeignKey('ticket_type.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    payment_status = db.Column(db.String(20), nullable=False)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Integer, nullable=False, default=0)  # in KES
+    tickets_issued = db.Column(db.Integer, nullable=False, default=0)
+    ticket_type = db.relationship('TicketType')
+
+    __table_args__ = (
+        db.UniqueConstraint('event_id', 'ticket_type_id', 'day', 'payment_status',
+                            name='uq_sales_summary_bucket'),
+    )
+
+class DataVersion(db.Model):
+    """Named counters that cached pages are keyed by (see pagecache.py)."""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+SUMMARY_KEY = ('event_id', 'ticket_type_id', 'day', 'payment_status')
+SUMMARY_TOTALS = ('orders', 'quantity', 'amount', 'tickets_issued')
+
 # ================== HELPERS ==================
 
+def upsert_statement(model):
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+def bump_sales_summary(order: Order, status, orders=0, quantity=0, amount=0, tickets_issued=0):
+    """Add deltas to the order's rollup bucket; flushed with the caller's transaction."""
+    if not order.ticket_type_id:
+        return
+    if order.created_at is None:
+        db.session.flush()
+    ticket_type = db.session.get(TicketType, order.ticket_type_id)
+    deltas = {
+        'orders': orders,
+        'quantity': quantity,
+        'amount': amount,
+        'tickets_issued': tickets_issued,
+    }
+    stmt = upsert_statement(SalesSummary).values(
+        event_id=ticket_type.event_id,
+        ticket_type_id=order.ticket_type_id,
+        day=order.created_at.date(),
+        payment_status=status,
+        **deltas
+    )
+    table = SalesSummary.__table__
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(SUMMARY_KEY),
+        set_={name: table.c[name] + stmt.excluded[name] for name in SUMMARY_TOTALS}
+    )
+    db.session.execute(stmt)
+
+def record_new_order(order: Order):
+    bump_sales_summary(order, order.payment_status or 'pending',
+                       orders=1, quantity=order.quantity or 0, amount=order.amount)
+
+def sales_summary_source():
+    """The rollup recomputed from scratch: one row per bucket, in SUMMARY_KEY + SUMMARY_TOTALS order."""
+    issued = (
+        db.select(Ticket.order_id, db.func.count().label('n'))
+        .group_by(Ticket.order_id)
+        .subquery()
+    )
+    day = db.func.date(Order.created_at, type_=db.Date)
+    status = db.func.coalesce(Order.payment_status, 'pending')
+    return (
+        db.select(
+            TicketType.event_id,
+            Order.ticket_type_id,
+            day,
+            status,
+            db.func.count(),
+            db.func.coalesce(db.func.sum(Order.quantity), 0),
+            db.func.coalesce(db.func.sum(Order.amount), 0),
+            db.func.coalesce(db.func.sum(issued.c.n), 0),
+        )
+        .join(TicketType, TicketType.id == Order.ticket_type_id)
+        .outerjoin(issued, issued.c.order_id == Order.id)
+        .group_by(TicketType.event_id, Order.ticket_type_id, day, status)
+    )
+
+def rebuild_sales_summary():
+    db.session.execute(db.delete(SalesSummary))
+    db.session.execute(
+        db.insert(SalesSummary).from_select(
+            list(SUMMARY_KEY + SUMMARY_TOTALS), sales_summary_source()
+        )
+    )
+    db.session.commit()
+
+def check_sales_summary():
+    """Compare the rollup with a full recount; returns a list of (bucket, stored, actual)."""
+    n = len(SUMMARY_KEY)
+    actual = {tuple(row[:n]): tuple(row[n:]) for row in db.session.execute(sales_summary_source())}
+    stored = {
+        tuple(getattr(r, k) for k in SUMMARY_KEY): tuple(getattr(r, k) for k in SUMMARY_TOTALS)
+        for r in SalesSummary.query
+    }
+    zero = (0,) * len(SUMMARY_TOTALS)
+    drift = []
+    for key in sorted(set(actual) | set(stored), key=str):
+        want = actual.get(key, zero)
+        have = stored.get(key, zero)
+        if want != have:
+            drift.append((key, have, want))
+    return drift
+
+def set_payment_status(order: Order, status):
+    """Change an order's payment status and move its totals between rollup buckets."""
+    old = order.payment_status or 'pending'
+    if old == status:
+        return
+    issued = len(order.tickets)
+    bump_sales_summary(order, old, orders=-1, quantity=-(order.quantity or 0),
+                       amount=-order.amount, tickets_issued=-issued)
+    bump_sales_summary(order, status, orders=1, quantity=order.quantity or 0,
+                       amount=order.amount, tickets_issued=issued)
+    order.payment_status = status
+
+# ---------- Data versions ----------
+
+# Names of the shared data versions. A flush that changes what one covers
+# bumps it (see bump_data_versions), so caches are dropped no wider than needed.
+CATALOG = 'catalog'  # the event list and event details: the landing page
+STOCK = 'stock'  # which tiers can still sell: sell-outs and quantity changes
+
+def event_version(event_id):
+    return f'event:{event_id}'  # one event and its tiers: its availability entry
+
+# columns caches show; sold_quantity moves with every sale and is not one of them
+EVENT_COLUMNS = {c.key for c in Event.__table__.columns}
+TIER_COLUMNS = {c.key for c in TicketType.__table__.columns} - {'sold_quantity'}
+
+def load_data_versions():
+    rows = db.session.execute(db.select(DataVersion.name, DataVersion.version, DataVersion.changed_at))
+    return {name: (version, changed_at) for name, version, changed_at in rows}
+
+def load_availability(event_id):
+    rows = db.session.execute(
+        db.select(TicketType.id, TicketType.name, TicketType.price,
+                  TicketType.total_quantity - db.func.coalesce(TicketType.sold_quantity, 0))
+        .select_from(Event).outerjoin(TicketType)
+        .where(Event.id == event_id)
+        .order_by(TicketType.id)
+    ).all()
+    if not rows:
+        return None
+    return [{'id': tier_id, 'name': name, 'price': price, 'remaining': max(remaining, 0)}
+            for tier_id, name, price, remaining in rows if tier_id is not None]
+
+data_versions = Versions(load_data_versions, DATA_VERSION_CHECK_SECONDS)
+page_cache = PageCache()
+availability = Availability(load_availability, AVAILABILITY_MAX_AGE)
+
+def load_sold_out():
+    return db.session.scalars(
+        db.select(TicketType.id)
+        .where(db.func.coalesce(TicketType.sold_quantity, 0) >= TicketType.total_quantity)
+    )
+
+sold_out = SoldOut(load_sold_out, AVAILABILITY_MAX_AGE)
+
+def event_availability(event_id):
+    """The event's tiers with tickets left (see AVAILABILITY_MAX_AGE); None if there is no such event."""
+    version = data_versions.get(event_version(event_id))[0], data_versions.get(STOCK)[0]
+    return availability.get(event_id, version)
+
+def sold_out_tiers():
+    return sold_out.get(data_versions.get(STOCK)[0])
+
+def bump_data_version(name, session=None):
+    """Invalidate what is cached under name on every worker, as part of the caller's transaction."""
+    session = session or db.session
+    now = datetime.utcnow()
+    stmt = upsert_statement(DataVersion).values(name=name, version=1, changed_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'version': DataVersion.__table__.c.version + 1, 'changed_at': now}
+    )
+    session.execute(stmt)
+    session.info['bumped_versions'] = True
+
+def changed_columns(obj, columns):
+    attrs = inspect(obj).attrs
+    return {key for key in columns if attrs[key].history.has_changes()}
+
+def changed_versions(session):
+    """The data versions a flush invalidates, from the session's pre-flush state."""
+    names = set()
+    for obj in list(session.new) + list(session.deleted) + list(session.dirty):
+        whole = obj in session.new or obj in session.deleted
+        if isinstance(obj, Event):
+            if whole or changed_columns(obj, EVENT_COLUMNS):
+                names.update((CATALOG, event_version(obj.id)))
+        elif isinstance(obj, TicketType):
+            changed = TIER_COLUMNS if whole else changed_columns(obj, TIER_COLUMNS)
+            if not changed:
+                continue
+            # a tier moved to another event leaves the old one's list too
+            event_ids = {obj.event_id, *inspect(obj).attrs.event_id.history.deleted}
+            names.update(event_version(e) for e in event_ids if e is not None)
+            if changed & {'total_quantity', 'event_id'}:
+                names.add(STOCK)
+    return names
+
+@event.listens_for(RoutingSession, 'after_flush')
+def bump_data_versions(session, flush_context):
+    # after the flush, so new events have ids; the bumps still commit with the change
+    names = changed_versions(session)
+    tier_ids = session.info.pop('stock_changed', None)
+    if tier_ids and STOCK not in names:
+        sold_out_now = session.execute(
+            db.select(TicketType.id)
+            .where(TicketType.id.in_(tier_ids),
+                   db.func.coalesce(TicketType.sold_quantity, 0) >= TicketType.total_quantity)
+            .limit(1)
+        ).first()
+        if sold_out_now:
+            names.add(STOCK)
+    for name in sorted(names):  # one lock order, so concurrent writers never deadlock
+        bump_data_version(name, session)
+
+@event.listens_for(RoutingSession, 'after_commit')
+def expire_data_versions(session):
+    # this worker serves its own change at once; the others within DATA_VERSION_CHECK_SECONDS
+    if session.info.pop('bumped_versions', False):
+        data_versions.expire()
+    for event_id, tier_id, quantity in session.info.pop('tickets_sold', ()):
+        availability.sold(event_id, tier_id, quantity)
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def forget_bumped_versions(session):
+    session.info.pop('bumped_versions', None)
+    session.info.pop('stock_changed', None)
+    session.info.pop('tickets_sold', None)
+
+def cached_page(key, version_name, render):
+    """Serve render() from the page cache until version_name is bumped; answers If-None-Match with 304."""
+    if not PAGE_CACHE:
+        return render()
+    version, changed_at = data_versions.get(version_name)
+    page = page_cache.get(key, version)
+    PAGE_CACHE_REQUESTS.inc(key, 'miss' if page is None else 'hit')
+    if page is None:
+        page = page_cache.put(key, version, render(), changed_at)
+    response = make_response(page.body)
+    response.set_etag(page.etag)
+    response.last_modified = page.last_modified
+    response.cache_control.no_cache = True  # browsers revalidate every time, cheaply
+    return response.make_conditional(request)
+
 def generate_ticket_code():
     return secrets.token_hex(4).upper()
 
 def generate_qr(code):
-    img = qrcode.make(code)
-    rel_path = os.path.join('static', 'qrs', f'{code}.png')
-    full_path = os.path.join(basedir, rel_path)
-    img.save(full_path)
+    import qrcode  # pulls in Pillow; loaded on first use, not at worker start
+
+    with QR_RENDER_SECONDS.time(), tracer.span('generate_qr', code=code):
+        with tracer.span('qrcode.make'):
+            img = qrcode.make(code)
+        rel_path = os.path.join('static', 'qrs', f'{code}.png')
+        full_path = os.path.join(basedir, rel_path)
+        with tracer.span('png.save'):
+            img.save(full_path)
     return '/' + rel_path
 
+def ticket_tier_options():
+    # both foreign keys are NOT NULL, so inner joins are safe (and FOR UPDATE-friendly)
+    return joinedload(Ticket.ticket_type, innerjoin=True).joinedload(TicketType.event, innerjoin=True)
+
+def order_graph_query():
+    """Orders with tier, tickets, and each ticket's tier and event: two queries, any ticket count."""
+    return Order.query.options(
+        joinedload(Order.ticket_type).joinedload(TicketType.event),
+        selectinload(Order.tickets).options(ticket_tier_options()),
+    )
+
 def send_ticket_email(order: Order):
     if not order.buyer_email:
         return
+    with EMAIL_OUTBOX.track(), EMAIL_SEND_SECONDS.time(), \
+            tracer.span('send_ticket_email', order_id=order.id):
+        try:
+            with tracer.span('email.build'):
+                msg = build_ticket_email(order)
+            with tracer.span('mail.send', attachments=len(msg.attachments)):
+                mail.send(msg)
+        except Exception:
+            EMAIL_FAILURES.inc()
+            raise
+
+def build_ticket_email(order: Order):
+    tickets = (Ticket.query.options(ticket_tier_options())
+               .filter_by(order_id=order.id).order_by(Ticket.id).all())
     lines = [
         f"Hi {order.buyer_name},",
         "",
@@ -117,7 +638,7 @@ def send_ticket_email(order: Order):
         "Here are your ticket details:",
         "",
     ]
-    for t in order.tickets:
+    for t in tickets:
         lines.append(
             f"- Event: {t.ticket_type.event.name}, "
             f"Type: {t.ticket_type.name}, "
@@ -130,7 +651,7 @@ def send_ticket_email(order: Order):
     msg = Message(subject="Your Event Ticket(s)", recipients=[order.buyer_email])
     msg.body = body
 
-    for t in order.tickets:
+    for t in tickets:
         if t.qr_path:
             fp = os.path.join(basedir, t.qr_path.lstrip('/'))
             if os.path.exists(fp):
@@ -140,34 +661,362 @@ def send_ticket_email(order: Order):
                         content_type='image/png',
                         data=f.read()
                     )
+    return msg
 
-    mail.send(msg)
+def issue_tickets(order: Order, ticket_type: TicketType, quantity: int, commit=True):
+    """Create tickets ONLY when payment is confirmed.
 
-def issue_tickets(order: Order, ticket_type: TicketType, quantity: int):
-    """Create tickets ONLY when payment is confirmed."""
+    With commit=False the tickets are only added to the session; the caller
+    commits and emails the buyer (see mark_orders_paid).
+    """
     if order.tickets:
-        return  # already issued
-    for _ in range(quantity):
-        code = generate_ticket_code()
-        qr_path = generate_qr(code)
-        t = Ticket(
-            order_id=order.id,
-            ticket_type_id=ticket_type.id,
-            code=code,
-            qr_path=qr_path
-        )
-        db.session.add(t)
-    ticket_type.sold_quantity += quantity
-    db.session.commit()
+        return False  # already issued
+    with tracer.span('issue_tickets', order_id=order.id, quantity=quantity):
+        for _ in range(quantity):
+            with tracer.span('generate_ticket_code'):
+                code = generate_ticket_code()
+            qr_path = generate_qr(code)
+            t = Ticket(
+                order_id=order.id,
+                ticket_type_id=ticket_type.id,
+                code=code,
+                qr_path=qr_path
+            )
+            db.session.add(t)
+        # before the update: bump_sales_summary may autoflush it (see bump_data_versions)
+        db.session.info.setdefault('stock_changed', set()).add(ticket_type.id)
+        # computed in SQL so concurrent issuers never overwrite each other's count
+        ticket_type.sold_quantity = db.func.coalesce(TicketType.sold_quantity, 0) + quantity
+        bump_sales_summary(order, order.payment_status, tickets_issued=quantity)
+        db.session.info.setdefault('tickets_sold', []).append(
+            (ticket_type.event_id, ticket_type.id, quantity))
+    if not commit:
+        return True
+    with tracer.span('db.commit'):
+        db.session.commit()
     try:
         send_ticket_email(order)
-    except Exception as e:
-        print("Email error:", e)
+    except Exception:
+        app.logger.exception("Emailing tickets for order %s failed", order.id)
+    return True
+
+def mark_orders_paid(orders):
+    """Mark pending orders paid and issue their tickets in a single commit.
+
+    Emails go out after the commit so a mail failure never rolls back a
+    payment. Returns the orders that were issued.
+    """
+    issued = []
+    with tracer.span('mark_orders_paid', orders=len(orders)):
+        for order in orders:
+            if order.payment_status != 'pending' or not order.ticket_type or not order.quantity:
+                continue
+            set_payment_status(order, 'paid')
+            if issue_tickets(order, order.ticket_type, order.quantity, commit=False):
+                issued.append(order)
+        with tracer.span('db.commit'):
+            db.session.commit()
+    for order in issued:
+        try:
+            send_ticket_email(order)
+        except Exception:
+            app.logger.exception("Emailing tickets for order %s failed", order.id)
+    return issued
+
+def pending_mpesa_codes():
+    """Map each submitted M-Pesa code to its pending (order_id, amount) pairs."""
+    pending = {}
+    rows = db.session.execute(
+        db.select(Order.id, Order.mpesa_code, Order.amount)
+        .where(Order.payment_status == 'pending', Order.mpesa_code.isnot(None))
+    )
+    for order_id, code, amount in rows:
+        pending.setdefault(code.strip().upper(), []).append((order_id, amount))
+    return pending
+
+def paid_mpesa_codes(codes, batch_size=RECONCILE_BATCH_SIZE):
+    """Map each of codes that is already on a paid order to that order's id."""
+    codes = list(codes)
+    paid = {}
+    for start in range(0, len(codes), batch_size):
+        rows = db.session.execute(
+            db.select(Order.id, Order.mpesa_code)
+            .where(Order.payment_status == 'paid',
+                   Order.mpesa_code.in_(codes[start:start + batch_size]))
+        )
+        for order_id, code in rows:
+            paid.setdefault(code.strip().upper(), order_id)
+    return paid
+
+def reconciliation_path(token, state=None):
+    """Matches awaiting confirmation; with state 'applying' or 'done', the apply job's progress."""
+    suffix = f'.{state}.json' if state else '.json'
+    return os.path.join(app.instance_path, 'reconcile', f'{token}{suffix}')
+
+def load_reconciliation(token):
+    """The apply job for token, with 'done' set once it finished; None if never confirmed."""
+    for state in ('applying', 'done'):
+        try:
+            with open(reconciliation_path(token, state)) as f:
+                return dict(json.load(f), done=state == 'done')
+        except FileNotFoundError:
+            continue
+    return None
+
+def save_json(path, value):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(value, f)
+    os.replace(tmp, path)
+
+def poster_key(event_id):
+    return f'event-{event_id}'
+
+def poster_original_path(event_id):
+    return os.path.join(app.instance_path, POSTER_DIR, poster_key(event_id))
+
+def event_poster(event):
+    """The renditions to show for event: its uploaded poster, else the default one."""
+    poster = load_poster(app.static_folder, poster_key(event.id)) if event and event.poster else None
+    return poster or load_poster(app.static_folder, DEFAULT_POSTER_KEY)
+
+def apply_reconciled_matches(matches, batch_size=RECONCILE_BATCH_SIZE):
+    """Mark matched orders paid, re-checking each is still pending with the same code and amount.
+
+    A code another order has been marked paid with since the preview is skipped.
+    """
+    expected = {m['order_id']: (m['code'], m['amount']) for m in matches}
+    ids = list(expected)
+    issued = 0
+    for start in range(0, len(ids), batch_size):
+        # rows another batch job is already issuing are skipped, not waited on
+        orders = (Order.query.options(joinedload(Order.ticket_type))
+                  .filter(Order.id.in_(ids[start:start + batch_size]),
+                          Order.payment_status == 'pending')
+                  .with_for_update(of=Order, skip_locked=True)
+                  .all())
+        orders = [o for o in orders
+                  if ((o.mpesa_code or '').strip().upper(), o.amount) == expected[o.id]]
+        # a receipt pays for one order only
+        paid = paid_mpesa_codes({expected[o.id][0] for o in orders})
+        orders = [o for o in orders if expected[o.id][0] not in paid]
+        issued += len(mark_orders_paid(orders))
+    return issued
+
+def apply_reconciliation(token, batch_size=RECONCILE_BATCH_SIZE, echo=None):
+    """Apply a confirmed reconciliation batch by batch; returns the job's final state.
+
+    The job file keeps only the matches not yet applied, so a job cut short
+    (a recycled worker, a deploy) resumes from its last batch when run again.
+    Orders a batch already marked paid fail the pending re-check and are skipped.
+    """
+    path = reconciliation_path(token, 'applying')
+    with open(path) as f:
+        job = json.load(f)
+    while job['matches']:
+        batch, job['matches'] = job['matches'][:batch_size], job['matches'][batch_size:]
+        job['applied'] += apply_reconciled_matches(batch, batch_size)
+        save_json(path, job)
+        if echo:
+            echo(f"  {job['applied']} marked paid, {len(job['matches'])} left to check")
+    os.replace(path, reconciliation_path(token, 'done'))
+    return job
+
+def start_reconciliation(token):
+    """Run apply_reconciliation in this worker, outside the request that confirmed it."""
+    def run():
+        with app.app_context():
+            try:
+                apply_reconciliation(token)
+            except Exception:
+                app.logger.exception("Reconciliation %s failed; finish it with "
+                                     "`flask apply-reconciliation %s`", token, token)
+            finally:
+                db.session.remove()
+    # daemon: a worker shutting down does not wait for it; the job file lets it resume
+    threading.Thread(target=run, name=f'reconcile-{token[:8]}', daemon=True).start()
+
+def remember_write():
+    session['wrote_at'] = time.time()
+
+def read_only(view):
+    """Serve a view from the read bind, unless this visitor wrote moments ago."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = time.time() - session.get('wrote_at', 0) >= READ_YOUR_WRITES_SECONDS
+        return view(*args, **kwargs)
+    return wrapper
+
+def session_login_enabled():
+    return bool(ADMIN_PASSWORD) and SECRET_KEY_SET
+
+def is_admin():
+    if session_login_enabled() and session.get('is_admin'):
+        return True
+    token = request.args.get('token')
+    return bool(ADMIN_TOKEN) and token == ADMIN_TOKEN
+
+def safe_next(default):
+    nxt = request.values.get('next', '')
+    # only same-site paths, never '//host' or absolute URLs; browsers treat a backslash as '/'
+    parts = urlsplit(nxt)
+    if nxt.startswith('/') and '\\' not in nxt and not parts.scheme and not parts.netloc:
+        return nxt
+    return default
+
+def encode_cursor(order: Order):
+    return f"{order.created_at.isoformat()}_{order.id}"
+
+def decode_cursor(value):
+    try:
+        created_at, order_id = value.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (AttributeError, ValueError):
+        return None
+
+def parse_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+EVENT_TIME_FORMAT = '%Y-%m-%dT%H:%M'  # <input type="datetime-local">
+
+def parse_event_form(form):
+    """Event fields from the admin form; returns (fields, error)."""
+    fields = {key: form.get(key, '').strip() for key in ('name', 'description', 'location')}
+    if not all(fields.values()):
+        return None, "Name, description and venue are required."
+    if len(fields['name']) > 150 or len(fields['location']) > 150:
+        return None, "Name and venue must be at most 150 characters."
+    try:
+        fields['start_time'] = datetime.strptime(form.get('start_time', ''), EVENT_TIME_FORMAT)
+        fields['end_time'] = datetime.strptime(form.get('end_time', ''), EVENT_TIME_FORMAT)
+    except ValueError:
+        return None, "Enter the start and end as date and time."
+    if fields['end_time'] <= fields['start_time']:
+        return None, "The event must end after it starts."
+    return fields, None
+
+def parse_tier_form(form, sold=0):
+    """Ticket type fields from the admin form; returns (fields, error)."""
+    name = form.get('name', '').strip()
+    if not name or len(name) > 50:
+        return None, "A ticket type needs a name of at most 50 characters."
+    price = form.get('price', type=int)
+    total = form.get('total_quantity', type=int)
+    if price is None or price < 0 or total is None or total < 0:
+        return None, "Price and quantity must be whole numbers, zero or more."
+    if total < sold:
+        return None, f"{sold} {name} ticket(s) are already sold; the quantity cannot go below that."
+    return {'name': name, 'price': price, 'total_quantity': total}, None
+
+def admin_orders_page(status, tier_id, date_from, date_to, after=None, before=None,
+                      page_size=ADMIN_PAGE_SIZE):
+    """One page of orders, newest first, using keyset pagination on (created_at, id).
+
+    Returns (orders, has_older, has_newer). Cost depends on page_size only, not
+    on how many orders precede the cursor.
+    """
+    query = Order.query.options(joinedload(Order.ticket_type))
+    if status != 'all':
+        query = query.filter(Order.payment_status == status)
+    if tier_id:
+        query = query.filter(Order.ticket_type_id == tier_id)
+    if date_from:
+        query = query.filter(Order.created_at >= date_from)
+    if date_to:
+        query = query.filter(Order.created_at < date_to + timedelta(days=1))
+
+    key = db.tuple_(Order.created_at, Order.id)
+    if before:
+        # walk towards newer rows, then flip back to newest-first
+        rows = (query.filter(key > before)
+                .order_by(Order.created_at.asc(), Order.id.asc())
+                .limit(page_size + 1).all())
+        has_newer = len(rows) > page_size
+        orders = list(reversed(rows[:page_size]))
+        return orders, True, has_newer
+
+    if after:
+        query = query.filter(key < after)
+    rows = (query.order_by(Order.created_at.desc(), Order.id.desc())
+            .limit(page_size + 1).all())
+    return rows[:page_size], len(rows) > page_size, after is not None
+
+def seed_synthetic_data(orders, events=1, tiers=3, seed=1, batch_size=10_000,
+                        used_ratio=0.3, headroom=1000, echo=None):
+    """Bulk-load a synthetic dataset (see synthetic.py), then rebuild the derived tables.
+
+    Search triggers are dropped for the load and the index rebuilt once at
+    the end, which is far cheaper than one FTS update per inserted row.
+    """
+    with db.engine.begin() as conn:
+        drop_search_triggers(conn)
+    try:
+        with db.engine.connect() as conn:
+            result = synthetic.generate(conn, orders, events=events, tiers=tiers, seed=seed,
+                                        batch_size=batch_size, used_ratio=used_ratio,
+                                        headroom=headroom, echo=echo)
+    finally:
+        with db.engine.begin() as conn:
+            if setup_search_index(conn):
+                rebuild_search_index(conn)
+    # Core inserts bypass the session's change tracking (see bump_data_versions)
+    for name in sorted({CATALOG, STOCK, *(event_version(e) for e in result['event_ids'])}):
+        bump_data_version(name)
+    rebuild_sales_summary()
+    return result
+
+# ================== MIGRATIONS ==================
+# Append new steps with the next version number; never edit an applied one.
+
+schema = Migrations()
+
+@schema.migration(1, 'initial schema')
+def migrate_initial_schema(ctx):
+    # creates only missing tables, so pre-migration databases keep their data
+    db.metadata.create_all(ctx.engine)
+
+@schema.migration(2, 'ticket check-in time')
+def migrate_ticket_used_at(ctx):
+    ctx.add_column('ticket', Ticket.__table__.c.used_at)
+
+@schema.migration(3, 'admin order list indexes')
+def migrate_admin_order_indexes(ctx):
+    ctx.create_index('ix_order_created_id', 'order', ['created_at', 'id'])
+    ctx.create_index('ix_order_status_created_id', 'order', ['payment_status', 'created_at', 'id'])
+    ctx.create_index('ix_order_tier_created_id', 'order', ['ticket_type_id', 'created_at', 'id'])
+
+@schema.migration(4, 'order search index')
+def migrate_order_search(ctx):
+    with ctx.engine.begin() as conn:
+        setup_search_index(conn)
+
+@schema.migration(5, 'sales summary backfill')
+def migrate_sales_summary(ctx):
+    if Order.query.first() and not SalesSummary.query.first():
+        rebuild_sales_summary()
+
+@schema.migration(6, 'ticket and M-Pesa code lookup indexes')
+def migrate_lookup_indexes(ctx):
+    ctx.create_index('ix_ticket_order_id', 'ticket', ['order_id'])
+    ctx.create_index('ix_order_mpesa_code', 'order', ['mpesa_code'])
+
+@schema.migration(7, 'data version counters')
+def migrate_data_versions(ctx):
+    DataVersion.__table__.create(ctx.engine, checkfirst=True)
+
+EVENT_POSTER_SCHEMA = 8
+
+@schema.migration(EVENT_POSTER_SCHEMA, 'event poster')
+def migrate_event_poster(ctx):
+    ctx.add_column('event', Event.__table__.c.poster)
 
 # ================== DB SETUP ==================
 
 def setup_db():
-    db.create_all()
+    schema.upgrade(db.engine)
     if not Event.query.first():
         e = Event(
             name='Pool Party - School Uniform Edition',
@@ -184,17 +1033,173 @@ def setup_db():
         db.session.add_all([tt1, tt2])
         db.session.commit()
 
+# ================== INSTRUMENTATION ==================
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info.pop('query_started')) * 1000
+    route = None
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+        g.query_ms = g.get('query_ms', 0.0) + elapsed_ms
+        route = request.endpoint
+    if elapsed_ms >= SLOW_QUERY_MS:
+        query_log.warning(json.dumps({
+            'event': 'slow_query',
+            'route': route,
+            'ms': round(elapsed_ms, 2),
+            'statement': ' '.join(statement.split())[:2000],
+        }))
+
+if QUERY_STATS:
+    event.listen(Engine, 'before_cursor_execute', start_query_timer)
+    event.listen(Engine, 'after_cursor_execute', record_query)
+
+def query_budget(limit):
+    """Cap the SQL statements a view may issue per request (see QUERY STATS CONFIG)."""
+    def decorate(view):
+        view.query_budget = limit
+        return view
+    return decorate
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.query_count, g.query_ms = 0, 0.0
+    g.trace_span = tracer.start_span('http.request', endpoint=request.endpoint,
+                                     method=request.method, path=request.path)
+
+@app.after_request
+def add_query_stats(response):
+    if not QUERY_STATS:
+        return response
+    count, db_ms = g.get('query_count', 0), g.get('query_ms', 0.0)
+    total_ms = (time.perf_counter() - g.request_started) * 1000
+    response.headers.add(
+        'Server-Timing', f'db;dur={db_ms:.1f};desc="{count} queries", app;dur={total_ms:.1f}'
+    )
+    budget = getattr(app.view_functions.get(request.endpoint), 'query_budget', None)
+    if budget is not None and count > budget and not g.get('over_budget'):
+        g.over_budget = True  # the error response passes through here again
+        message = f"{request.endpoint} issued {count} SQL statements, budget is {budget}"
+        if QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        query_log.warning(json.dumps({'event': 'query_budget', 'route': request.endpoint,
+                                      'queries': count, 'budget': budget}))
+    return response
+
+@app.teardown_request
+def log_query_stats(exc):
+    # teardown also runs after a streamed response has finished
+    if not QUERY_STATS or 'request_started' not in g:
+        return
+    query_log.info(json.dumps({
+        'event': 'request',
+        'route': request.endpoint,
+        'method': request.method,
+        'path': request.path,
+        'queries': g.get('query_count', 0),
+        'db_ms': round(g.get('query_ms', 0.0), 2),
+        'total_ms': round((time.perf_counter() - g.request_started) * 1000, 2),
+        'error': type(exc).__name__ if exc else None,
+        'trace_id': g.trace_span.trace_id if 'trace_span' in g else None,
+    }))
+
+def metrics_endpoint():
+    return request.endpoint or 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_endpoint = metrics_endpoint()
+    IN_FLIGHT.inc(g.metrics_endpoint)
+
+@app.after_request
+def remember_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(exc):
+    if 'metrics_endpoint' not in g:
+        return
+    endpoint = g.pop('metrics_endpoint')
+    IN_FLIGHT.dec(endpoint)
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint, request.method)
+    status = 500 if exc else g.get('response_status', 500)
+    REQUESTS.inc(endpoint, request.method, str(status))
+
+@app.teardown_request
+def end_request_span(exc):
+    # teardown hooks run in reverse order: log_query_stats still reads g.trace_span
+    span = g.get('trace_span')
+    if span is None:
+        return
+    span.set('status', 500 if exc else g.get('response_status', 500))
+    span.set('queries', g.get('query_count', 0))
+    tracer.end_span(span, exc)
+
+csrf.init_app(app)
+
+@metrics.collector
+def collect_pool_stats():
+    samples = {'size': [], 'checked_out': [], 'overflow': []}
+    for bind, engine in db.engines.items():
+        pool = engine.pool
+        if not hasattr(pool, 'checkedout'):
+            continue  # SingletonThreadPool / NullPool keep no counts
+        labels = {'bind': bind or 'default'}
+        samples['size'].append((labels, pool.size()))
+        samples['checked_out'].append((labels, pool.checkedout()))
+        samples['overflow'].append((labels, max(pool.overflow(), 0)))
+    return [
+        ('db_pool_size', 'gauge', 'Connections the pool keeps open.', samples['size']),
+        ('db_pool_checked_out', 'gauge', 'Connections in use.', samples['checked_out']),
+        ('db_pool_overflow', 'gauge', 'Connections opened beyond pool_size.', samples['overflow']),
+    ]
+
+@metrics.collector
+def collect_inventory():
+    rows = (db.session.query(TicketType.id, TicketType.name, TicketType.event_id,
+                             TicketType.total_quantity, TicketType.sold_quantity)
+            .order_by(TicketType.id).all())
+    total, sold = [], []
+    for tier_id, name, event_id, total_quantity, sold_quantity in rows:
+        labels = {'ticket_type_id': tier_id, 'ticket_type': name, 'event_id': event_id}
+        total.append((labels, total_quantity or 0))
+        sold.append((labels, sold_quantity or 0))
+    return [
+        ('tickets_total', 'gauge', 'Tickets on sale per tier.', total),
+        ('tickets_sold', 'gauge', 'Tickets sold per tier.', sold),
+    ]
+
 # ================== ROUTES ==================
 
 @app.route('/')
+@read_only
+@query_budget(2)
 def events():
-    events = Event.query.all()
-    return render_template('events.html', events=events)
+    def render():
+        events = Event.query.all()
+        # the page's hero is the first event; so is its poster
+        return render_template('events.html', events=events,
+                               poster=event_poster(events[0] if events else None))
+    return cached_page('events', CATALOG, render)
 
 @app.route('/buy/<int:event_id>', methods=['GET', 'POST'])
+@csrf.exempt
 def buy(event_id):
+    if request.method == 'POST':
+        tier_id = request.form.get('ticket_type_id', type=int)
+        if tier_id in sold_out_tiers():
+            SOLD_OUT_REJECTIONS.inc(str(tier_id))
+            return "Sorry, that ticket type is sold out.", 400
+
     event = Event.query.get_or_404(event_id)
-    ticket_types = event.ticket_types
 
     if request.method == 'POST':
         ticket_type_id = int(request.form['ticket_type_id'])
@@ -210,6 +1215,8 @@ def buy(event_id):
         if quantity < 1:
             return "Invalid quantity.", 400
         if tt.sold_quantity + quantity > tt.total_quantity:
+            if tt.sold_quantity >= tt.total_quantity:
+                sold_out.mark(tt.id)
             return "Not enough tickets left.", 400
 
         amount = tt.price * quantity
@@ -226,7 +1233,9 @@ def buy(event_id):
             mpesa_code=mpesa_code or None
         )
         db.session.add(order)
+        record_new_order(order)
         db.session.commit()
+        remember_write()
 
         return render_template(
             'mpesa_manual_pending.html',
@@ -239,22 +1248,186 @@ def buy(event_id):
     return render_template(
         'buy.html',
         event=event,
-        ticket_types=ticket_types,
+        ticket_types=event_availability(event_id),
+        sold_out=sold_out_tiers(),
         paybill_number=MANUAL_PAYBILL_NUMBER,
         pay_name=MANUAL_PAY_NAME
     )
 
-@app.route('/admin/mark_paid/<int:order_id>')
+@app.route('/order/<int:order_id>/mpesa_code', methods=['POST'])
+@csrf.exempt
+def submit_mpesa_code(order_id):
+    order = Order.query.get_or_404(order_id)
+    code = request.form.get('mpesa_code', '').strip().upper()
+    if order.payment_status == 'pending' and code:
+        order.mpesa_code = code
+        db.session.commit()
+        remember_write()
+    return redirect(url_for('order_detail', order_id=order.id))
+
+@app.route('/api/availability/<int:event_id>')
+@read_only
+@query_budget(3)
+def api_availability(event_id):
+    tiers = event_availability(event_id)
+    if tiers is None:
+        return jsonify({'error': 'Event not found.'}), 404
+    closed = sold_out_tiers()
+    response = jsonify({
+        'event_id': event_id,
+        'max_age': AVAILABILITY_MAX_AGE,
+        'ticket_types': [dict(t, sold_out=t['id'] in closed) for t in tiers],
+    })
+    response.cache_control.max_age = int(AVAILABILITY_MAX_AGE)
+    return response
+
+# ---------- Static ----------
+
+@app.url_defaults
+def hashed_static_url(endpoint, values):
+    if endpoint == 'static' and STATIC_MANIFEST:
+        entry = STATIC_MANIFEST.get(values.get('filename'))
+        if entry:
+            values['filename'] = entry['path']
+
+def serve_static(filename):
+    """Flask's static view, plus immutable caching for build output and posters, and precompressed variants."""
+    entry = HASHED_ASSETS.get(filename)
+    poster = filename.startswith(f'{POSTER_DIR}/') and filename.endswith(POSTER_EXTENSIONS)
+    if entry is None and not poster:
+        return app.send_static_file(filename)
+    served = filename
+    for encoding in entry['encodings'] if entry else ():
+        if request.accept_encodings[encoding]:
+            served += ASSET_SUFFIXES[encoding]  # send_file sets Content-Encoding from the suffix
+            break
+    response = send_from_directory(app.static_folder, served, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if entry and entry['encodings']:
+        response.vary.add('Accept-Encoding')
+    return response
+
+app.view_functions['static'] = serve_static
+
+# ---------- Admin ----------
+
+@app.errorhandler(CSRFError)
+def csrf_error(e):
+    return f"{e.description} Reload the page and try again.", 400
+
+@app.route('/admin/login', methods=['GET', 'POST'])
+def admin_login():
+    if not session_login_enabled():
+        return render_template('admin_login.html',
+                               error="Admin login needs ADMIN_PASSWORD and SECRET_KEY set."), 403
+    if request.method == 'POST':
+        username = request.form.get('username', '')
+        password = request.form.get('password', '')
+        if (secrets.compare_digest(username, ADMIN_USERNAME)
+                and secrets.compare_digest(password, ADMIN_PASSWORD)):
+            session['is_admin'] = True
+            return redirect(safe_next(url_for('admin_orders')))
+        return render_template('admin_login.html', error="Invalid credentials."), 401
+    return render_template('admin_login.html')
+
+@app.route('/admin/logout')
+def admin_logout():
+    session.pop('is_admin', None)
+    return redirect(url_for('admin_login'))
+
+@app.route('/admin/orders')
+def admin_orders():
+    if not is_admin():
+        return redirect(url_for('admin_login', next=request.full_path))
+
+    status = request.args.get('status', 'pending')
+    if status not in ('pending', 'paid', 'failed', 'all'):
+        status = 'pending'
+    tier_id = request.args.get('tier', type=int)
+    date_from = parse_day(request.args.get('from'))
+    date_to = parse_day(request.args.get('to'))
+    after = decode_cursor(request.args.get('after'))
+    before = decode_cursor(request.args.get('before')) if not after else None
+
+    orders, has_older, has_newer = admin_orders_page(
+        status, tier_id, date_from, date_to, after=after, before=before
+    )
+    filters = {
+        'status': status,
+        'tier': tier_id or None,
+        'from': date_from.strftime('%Y-%m-%d') if date_from else None,
+        'to': date_to.strftime('%Y-%m-%d') if date_to else None,
+    }
+    older_url = newer_url = None
+    if orders and has_older:
+        older_url = url_for('admin_orders', after=encode_cursor(orders[-1]), **filters)
+    if orders and has_newer:
+        newer_url = url_for('admin_orders', before=encode_cursor(orders[0]), **filters)
+
+    return render_template(
+        'admin_orders.html',
+        orders=orders,
+        status=status,
+        filters=filters,
+        events=Event.query.order_by(Event.start_time).all(),
+        ticket_types=TicketType.query.order_by(TicketType.id).all(),
+        older_url=older_url,
+        newer_url=newer_url,
+        first_url=url_for('admin_orders', **filters) if (after or before) else None,
+        paybill_number=MANUAL_PAYBILL_NUMBER,
+        pay_name=MANUAL_PAY_NAME
+    )
+
+@app.route('/admin/dashboard')
+def admin_dashboard():
+    if not is_admin():
+        return redirect(url_for('admin_login', next=request.full_path))
+
+    tiers = (
+        db.session.query(
+            SalesSummary.ticket_type_id,
+            SalesSummary.payment_status,
+            db.func.sum(SalesSummary.orders),
+            db.func.sum(SalesSummary.quantity),
+            db.func.sum(SalesSummary.amount),
+            db.func.sum(SalesSummary.tickets_issued),
+        )
+        .group_by(SalesSummary.ticket_type_id, SalesSummary.payment_status)
+        .all()
+    )
+    by_tier = {}
+    for tt_id, status, orders, quantity, amount, issued in tiers:
+        by_tier.setdefault(tt_id, {})[status] = {
+            'orders': orders, 'quantity': quantity, 'amount': amount, 'issued': issued
+        }
+    daily = (
+        db.session.query(SalesSummary.day, db.func.sum(SalesSummary.quantity),
+                         db.func.sum(SalesSummary.amount))
+        .filter(SalesSummary.payment_status == 'paid')
+        .group_by(SalesSummary.day)
+        .order_by(SalesSummary.day.desc())
+        .limit(14)
+        .all()
+    )
+    return render_template(
+        'admin_dashboard.html',
+        ticket_types=TicketType.query.options(joinedload(TicketType.event)).order_by(TicketType.id).all(),
+        by_tier=by_tier,
+        daily=daily
+    )
+
+@app.route('/admin/mark_paid/<int:order_id>', methods=['POST'])
 def admin_mark_paid(order_id):
-    token = request.args.get('token')
-    if not ADMIN_TOKEN or token != ADMIN_TOKEN:
+    if not is_admin():
         return "Forbidden", 403
 
-    order = Order.query.get_or_404(order_id)
+    # lock the order so two admins clicking at once can't both issue tickets
+    order = Order.query.filter_by(id=order_id).with_for_update().first_or_404()
     if order.payment_status == 'paid':
         return f"Order {order.id} already marked as paid.", 200
 
-    order.payment_status = 'paid'
+    set_payment_status(order, 'paid')
     db.session.commit()
 
     ticket_type = TicketType.query.get(order.ticket_type_id)
@@ -262,43 +1435,559 @@ def admin_mark_paid(order_id):
         return "Ticket type information missing. Cannot issue tickets.", 400
 
     issue_tickets(order, ticket_type, order.quantity)
+    if request.args.get('next'):
+        return redirect(safe_next(url_for('admin_orders')))
     return f"Order {order.id} marked as paid and {order.quantity} ticket(s) issued.", 200
 
+@app.route('/admin/mark_failed/<int:order_id>', methods=['POST'])
+def admin_mark_failed(order_id):
+    if not is_admin():
+        return "Forbidden", 403
+
+    order = Order.query.filter_by(id=order_id).with_for_update().first_or_404()
+    if order.payment_status != 'paid':
+        set_payment_status(order, 'failed')
+        db.session.commit()
+    return redirect(safe_next(url_for('admin_orders')))
+
+@app.route('/admin/orders/<int:order_id>/tickets.zip')
+def admin_download_tickets(order_id):
+    if not is_admin():
+        return "Forbidden", 403
+
+    order = Order.query.get_or_404(order_id)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for t in order.tickets:
+            if t.qr_path:
+                fp = os.path.join(basedir, t.qr_path.lstrip('/'))
+                if os.path.exists(fp):
+                    zf.write(fp, arcname=os.path.basename(fp))
+    buf.seek(0)
+    return send_file(
+        buf,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name=f'order-{order.id}-tickets.zip'
+    )
+
+@app.route('/admin/reconcile', methods=['GET', 'POST'])
+def admin_reconcile():
+    if not is_admin():
+        return redirect(url_for('admin_login', next=request.path))
+
+    if request.method == 'GET':
+        return render_template('admin_reconcile.html', result=None)
+
+    upload = request.files.get('statement')
+    if not upload or not upload.filename:
+        return render_template('admin_reconcile.html', result=None,
+                               error="Choose a statement file to upload."), 400
+    try:
+        rows = iter_statement_rows(upload.filename, upload.stream)
+        pending = pending_mpesa_codes()
+        result = reconcile(iter_statement_lines(rows), pending, paid_mpesa_codes(pending))
+    except ValueError as e:
+        return render_template('admin_reconcile.html', result=None, error=str(e)), 400
+
+    # matches are kept server-side so a 100k-line statement doesn't become a 100k-field form
+    token = secrets.token_hex(16) if result['matches'] else None
+    if token:
+        path = reconciliation_path(token)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        save_json(path, {
+            'submitted': len(result['matches']),
+            'applied': 0,
+            'matches': [{'order_id': m['order_id'], 'code': m['code'], 'amount': m['amount']}
+                        for m in result['matches']],
+        })
+
+    return render_template(
+        'admin_reconcile.html',
+        result=result,
+        token=token,
+        filename=upload.filename,
+        preview_rows=RECONCILE_PREVIEW_ROWS
+    )
+
+@app.route('/admin/reconcile/<token>/confirm', methods=['POST'])
+def admin_reconcile_confirm(token):
+    if not is_admin():
+        return "Forbidden", 403
+    if not all(c in '0123456789abcdef' for c in token):
+        return "Unknown reconciliation.", 404
+
+    # the rename claims the matches, so a second click cannot apply them twice
+    try:
+        os.rename(reconciliation_path(token), reconciliation_path(token, 'applying'))
+    except FileNotFoundError:
+        return "Unknown or already applied reconciliation.", 404
+    start_reconciliation(token)
+    return redirect(url_for('admin_reconcile_status', token=token))
+
+@app.route('/admin/reconcile/<token>')
+def admin_reconcile_status(token):
+    if not is_admin():
+        return redirect(url_for('admin_login', next=request.path))
+    if not all(c in '0123456789abcdef' for c in token):
+        return "Unknown reconciliation.", 404
+
+    job = load_reconciliation(token)
+    if job is None:
+        return "Unknown reconciliation.", 404
+    return render_template('admin_reconcile.html', result=None, job=job, token=token)
+
+@app.route('/admin/events', methods=['GET', 'POST'])
+def admin_events():
+    if not is_admin():
+        return redirect(url_for('admin_login', next=request.path))
+
+    error = None
+    if request.method == 'POST':
+        fields, error = parse_event_form(request.form)
+        if not error:
+            event = Event(**fields)
+            db.session.add(event)
+            db.session.commit()  # bumps the catalogue (see bump_data_versions)
+            return redirect(url_for('admin_event', event_id=event.id))
+
+    events = (Event.query.options(selectinload(Event.ticket_types))
+              .order_by(Event.start_time).all())
+    return render_template('admin_events.html', events=events, event=None,
+                           form=request.form if error else None, error=error), 400 if error else 200
+
+def render_admin_event(event, error=None, form=None):
+    return render_template(
+        'admin_event.html',
+        event=event,
+        ticket_types=TicketType.query.filter_by(event_id=event.id).order_by(TicketType.id).all(),
+        poster=event_poster(event) if event.poster else None,
+        max_poster_mb=POSTER_MAX_BYTES // (1024 * 1024),
+        form=form,
+        error=error
+    ), 400 if error else 200
+
+@app.route('/admin/events/<int:event_id>', methods=['GET', 'POST'])
+def admin_event(event_id):
+    if not is_admin():
+        return redirect(url_for('admin_login', next=request.path))
+
+    event = Event.query.get_or_404(event_id)
+    if request.method == 'POST':
+        fields, error = parse_event_form(request.form)
+        if error:
+            return render_admin_event(event, error, form=request.form)
+        for key, value in fields.items():
+            setattr(event, key, value)
+        db.session.commit()
+        return redirect(url_for('admin_event', event_id=event.id))
+    return render_admin_event(event)
+
+@app.route('/admin/events/<int:event_id>/delete', methods=['POST'])
+def admin_delete_event(event_id):
+    if not is_admin():
+        return "Forbidden", 403
+
+    event = Event.query.get_or_404(event_id)
+    tier_ids = [tt.id for tt in event.ticket_types]
+    if tier_ids and Order.query.filter(Order.ticket_type_id.in_(tier_ids)).first():
+        return render_admin_event(event, "This event has orders; it cannot be deleted.")
+    SalesSummary.query.filter_by(event_id=event.id).delete()
+    for tt in event.ticket_types:
+        db.session.delete(tt)
+    db.session.delete(event)
+    db.session.commit()
+
+    remove_poster(app.static_folder, poster_key(event_id))
+    try:
+        os.remove(poster_original_path(event_id))
+    except FileNotFoundError:
+        pass
+    return redirect(url_for('admin_events'))
+
+@app.route('/admin/events/<int:event_id>/poster', methods=['POST'])
+def admin_event_poster(event_id):
+    if not is_admin():
+        return "Forbidden", 403
+
+    event = Event.query.get_or_404(event_id)
+    upload = request.files.get('poster')
+    if not upload or not upload.filename:
+        return render_admin_event(event, "Choose an image to upload.")
+    data = upload.stream.read(POSTER_MAX_BYTES + 1)
+    if len(data) > POSTER_MAX_BYTES:
+        return render_admin_event(event, f"Posters must be at most {POSTER_MAX_BYTES // (1024 * 1024)} MB.")
+    try:
+        poster = render_poster(io.BytesIO(data), app.static_folder, poster_key(event.id))
+    except ValueError as e:
+        return render_admin_event(event, str(e))
+
+    # static/posters is not in git: build-assets renders it again from this on a fresh deploy
+    path = poster_original_path(event.id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    event.poster = poster['hash']
+    db.session.commit()  # the new hash bumps the catalogue and this event
+    return redirect(url_for('admin_event', event_id=event.id))
+
+@app.route('/admin/events/<int:event_id>/tiers', methods=['POST'])
+def admin_add_tier(event_id):
+    if not is_admin():
+        return "Forbidden", 403
+
+    event = Event.query.get_or_404(event_id)
+    fields, error = parse_tier_form(request.form)
+    if error:
+        return render_admin_event(event, error)
+    db.session.add(TicketType(event_id=event.id, sold_quantity=0, **fields))
+    db.session.commit()
+    return redirect(url_for('admin_event', event_id=event.id))
+
+@app.route('/admin/tiers/<int:tier_id>', methods=['POST'])
+def admin_edit_tier(tier_id):
+    if not is_admin():
+        return "Forbidden", 403
+
+    # locked so a sale cannot slip in between the sold check and the update
+    tt = TicketType.query.filter_by(id=tier_id).with_for_update().first_or_404()
+    fields, error = parse_tier_form(request.form, sold=tt.sold_quantity or 0)
+    if error:
+        db.session.rollback()
+        return render_admin_event(tt.event, error)
+    for key, value in fields.items():
+        setattr(tt, key, value)
+    db.session.commit()  # bumps this event, and stock if the quantity changed
+    return redirect(url_for('admin_event', event_id=tt.event_id))
+
+@app.route('/admin/tiers/<int:tier_id>/delete', methods=['POST'])
+def admin_delete_tier(tier_id):
+    if not is_admin():
+        return "Forbidden", 403
+
+    tt = TicketType.query.get_or_404(tier_id)
+    event = tt.event
+    if Order.query.filter_by(ticket_type_id=tt.id).first():
+        return render_admin_event(event, f"{tt.name} has orders; it cannot be deleted.")
+    SalesSummary.query.filter_by(ticket_type_id=tt.id).delete()
+    db.session.delete(tt)
+    db.session.commit()
+    return redirect(url_for('admin_event', event_id=event.id))
+
+@app.route('/admin/search')
+def admin_search():
+    if not is_admin():
+        return redirect(url_for('admin_login', next=request.full_path))
+
+    q = request.args.get('q', '').strip()
+    order_ids = search_order_ids(db.session.connection(), q, SEARCH_RESULT_LIMIT) if q else []
+    by_id = {
+        o.id: o for o in Order.query
+        .options(joinedload(Order.ticket_type), selectinload(Order.tickets))
+        .filter(Order.id.in_(order_ids))
+    } if order_ids else {}
+    orders = [by_id[i] for i in order_ids if i in by_id]
+
+    if request.args.get('format') == 'json':
+        return jsonify([
+            {
+                'id': o.id,
+                'buyer_name': o.buyer_name,
+                'buyer_email': o.buyer_email,
+                'buyer_phone': o.buyer_phone,
+                'mpesa_code': o.mpesa_code,
+                'payment_status': o.payment_status,
+                'amount': o.amount,
+                'ticket_type': o.ticket_type.name if o.ticket_type else None,
+                'tickets': [t.code for t in o.tickets],
+                'created_at': o.created_at.isoformat() if o.created_at else None,
+            }
+            for o in orders
+        ])
+    return render_template('admin_search.html', q=q, orders=orders)
+
+EXPORT_HEADER = (
+    'Order', 'Ordered At', 'Buyer', 'Email', 'Phone', 'Payment Status', 'M-Pesa Code',
+    'Tier', 'Ticket Code', 'Ticket Status', 'Checked In At'
+)
+
+def iter_event_export_rows(event_id):
+    """One row per ticket (or per order with no tickets yet), streamed from the DB."""
+    stmt = (
+        db.select(
+            Order.id, Order.created_at, Order.buyer_name, Order.buyer_email,
+            Order.buyer_phone, Order.payment_status, Order.mpesa_code,
+            TicketType.name, Ticket.code, Ticket.status, Ticket.used_at
+        )
+        .join(TicketType, TicketType.id == Order.ticket_type_id)
+        .outerjoin(Ticket, Ticket.order_id == Order.id)
+        .where(TicketType.event_id == event_id)
+        .order_by(Order.id, Ticket.id)
+        .execution_options(yield_per=EXPORT_YIELD_PER)
+    )
+    for row in db.session.execute(stmt):
+        yield tuple(row)
+
+@app.route('/admin/events/<int:event_id>/export.<fmt>')
+def admin_export_event(event_id, fmt):
+    if not is_admin():
+        return "Forbidden", 403
+    if fmt not in ('csv', 'xlsx'):
+        return "Unsupported export format.", 404
+
+    event = Event.query.get_or_404(event_id)
+    rows = iter_event_export_rows(event.id)
+    if fmt == 'csv':
+        body = iter_csv(EXPORT_HEADER, rows)
+        mimetype = 'text/csv'
+    else:
+        body = iter_xlsx(EXPORT_HEADER, rows, sheet_name='Attendance')
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=event-{event.id}-attendance.{fmt}'}
+    )
+
 # ---------- Views ----------
 
+@app.route('/metrics')
+@read_only
+def metrics_view():
+    bearer = request.headers.get('Authorization', '')
+    if not (is_admin() or (METRICS_TOKEN and bearer == f'Bearer {METRICS_TOKEN}')):
+        return "Forbidden", 403
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/order/<int:order_id>')
+@read_only
+@query_budget(2)
 def order_detail(order_id):
-    order = Order.query.get_or_404(order_id)
+    order = order_graph_query().filter_by(id=order_id).first_or_404()
     return render_template('order_detail.html', order=order)
 
 @app.route('/ticket/<code>')
+@read_only
+@query_budget(1)
 def ticket_detail(code):
-    ticket = Ticket.query.filter_by(code=code).first_or_404()
+    ticket = Ticket.query.options(ticket_tier_options()).filter_by(code=code).first_or_404()
     return render_template('ticket.html', ticket=ticket)
 
+@app.route('/ticket/<code>/download')
+def download_ticket(code):
+    ticket = Ticket.query.filter_by(code=code).first_or_404()
+    fp = os.path.join(basedir, (ticket.qr_path or '').lstrip('/'))
+    if not ticket.qr_path or not os.path.exists(fp):
+        return "Ticket QR code not found.", 404
+    return send_file(fp, mimetype='image/png', as_attachment=True,
+                     download_name=f'ticket-{ticket.code}.png')
+
 @app.route('/validate', methods=['GET', 'POST'])
+@csrf.exempt
+@query_budget(2)
 def validate_ticket():
     result = None
     if request.method == 'POST':
         code = request.form['code'].strip().upper()
-        ticket = Ticket.query.filter_by(code=code).first()
+        # two gates scanning the same code: the second waits and sees 'used'
+        ticket = (Ticket.query.options(ticket_tier_options())
+                  .filter_by(code=code).with_for_update(of=Ticket).first())
         if not ticket:
             result = "❌ Invalid ticket."
         elif ticket.status == 'used':
             result = "⚠️ Ticket already used."
         else:
             ticket.status = 'used'
-            db.session.commit()
+            ticket.used_at = datetime.utcnow()
+            # read before commit: afterwards every attribute would be reloaded
             result = f"✅ Valid ticket: {ticket.ticket_type.event.name} - {ticket.ticket_type.name}"
+            db.session.commit()
     return render_template('validate.html', result=result)
 
+# ================== CLI ==================
+
+@app.cli.command('reconcile-statement')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--apply', 'apply_matches', is_flag=True,
+              help='Mark matched orders paid and issue their tickets.')
+def reconcile_statement_command(path, apply_matches):
+    """Reconcile an M-Pesa statement export (CSV/XLSX) against pending orders."""
+    with open(path, 'rb') as f:
+        try:
+            pending = pending_mpesa_codes()
+            result = reconcile(iter_statement_lines(iter_statement_rows(path, f)),
+                               pending, paid_mpesa_codes(pending))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    click.echo(f"{result['lines']} statement lines: "
+               f"{len(result['matches'])} matched, {len(result['mismatches'])} amount mismatches, "
+               f"{len(result['duplicates'])} duplicates, {len(result['unmatched'])} unmatched")
+    for entry in result['mismatches']:
+        click.echo(f"  mismatch line {entry['line']}: {entry['code']} paid {entry['paid']}, "
+                   f"order #{entry['order_id']} expects {entry['amount']}")
+    for entry in result['duplicates']:
+        click.echo(f"  duplicate line {entry['line']}: {entry['code']} - {entry['reason']}")
+
+    if apply_matches and result['matches']:
+        issued = apply_reconciled_matches(result['matches'])
+        click.echo(f"Marked {issued} order(s) paid and issued their tickets.")
+
+@app.cli.command('apply-reconciliation')
+@click.argument('token')
+def apply_reconciliation_command(token):
+    """Finish a reconciliation confirmed on /admin/reconcile that was cut short."""
+    if not os.path.exists(reconciliation_path(token, 'applying')):
+        raise click.ClickException(f"No unfinished reconciliation {token}.")
+    job = apply_reconciliation(token, echo=click.echo)
+    click.echo(f"Marked {job['applied']} of {job['submitted']} matched order(s) paid.")
+
+@app.cli.command('build-assets')
+@click.option('--clean', is_flag=True, help='Remove hashed files left by earlier builds.')
+def build_assets_command(clean):
+    """Render poster renditions, then content-hash and precompress static files (see assets.py)."""
+    render_poster(os.path.join(app.static_folder, DEFAULT_POSTER), app.static_folder,
+                  DEFAULT_POSTER_KEY, echo=click.echo)
+    # a build step may run with no database, or before migrating it
+    try:
+        migrated = schema.current(db.engine) >= EVENT_POSTER_SCHEMA
+    except OperationalError:
+        migrated = False
+    if migrated:
+        for e in Event.query.filter(Event.poster.isnot(None)).order_by(Event.id):
+            path = poster_original_path(e.id)
+            if os.path.exists(path):
+                render_poster(path, app.static_folder, poster_key(e.id), echo=click.echo)
+    else:
+        click.echo("  skipped uploaded event posters: the database is not migrated")
+    manifest = build_assets(app.static_folder, clean=clean, echo=click.echo)
+    click.echo(f"Built {len(manifest)} static assets." +
+               ("" if brotli else " Install brotli to add .br variants."))
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Repopulate the order search index from the order and ticket tables."""
+    with db.engine.begin() as conn:
+        if not setup_search_index(conn):
+            raise click.ClickException("Search index requires the SQLite backend.")
+        rebuild_search_index(conn)
+    click.echo("Search index rebuilt.")
+
+@app.cli.command('rebuild-sales-summary')
+def rebuild_sales_summary_command():
+    """Recompute the sales rollup table from orders and tickets."""
+    rebuild_sales_summary()
+    click.echo(f"Sales summary rebuilt: {SalesSummary.query.count()} bucket(s).")
+
+@app.cli.command('check-sales-summary')
+@click.option('--fix', is_flag=True, help='Rebuild the rollup if it has drifted.')
+def check_sales_summary_command(fix):
+    """Verify the sales rollup against a full recount of orders and tickets."""
+    drift = check_sales_summary()
+    if not drift:
+        click.echo("Sales summary is consistent.")
+        return
+    for key, have, want in drift:
+        bucket = dict(zip(SUMMARY_KEY, key))
+        click.echo(f"  {bucket}: stored {dict(zip(SUMMARY_TOTALS, have))}, "
+                   f"actual {dict(zip(SUMMARY_TOTALS, want))}")
+    if fix:
+        rebuild_sales_summary()
+        click.echo(f"Rebuilt after {len(drift)} drifted bucket(s).")
+        return
+    raise click.ClickException(f"{len(drift)} bucket(s) drifted; rerun with --fix.")
+
+@app.cli.command('seed-synthetic')
+@click.option('--orders', type=int, default=100_000, show_default=True)
+@click.option('--events', type=int, default=1, show_default=True)
+@click.option('--tiers', type=click.IntRange(1, len(synthetic.TIERS)), default=3, show_default=True)
+@click.option('--seed', type=int, default=1, show_default=True, help='Same seed, same rows.')
+@click.option('--batch-size', type=int, default=10_000, show_default=True)
+@click.option('--used-ratio', type=float, default=0.3, show_default=True,
+              help='Share of issued tickets already scanned at the gate.')
+@click.option('--statement', type=click.Path(dir_okay=False, writable=True),
+              help='Also write an M-Pesa statement CSV for the new orders.')
+def seed_synthetic_command(orders, events, tiers, seed, batch_size, used_ratio, statement):
+    """Bulk-load synthetic events, orders and tickets into DATABASE_URL (for load tests)."""
+    schema.upgrade(db.engine, echo=click.echo)
+    started = time.perf_counter()
+    result = seed_synthetic_data(orders, events=events, tiers=tiers, seed=seed,
+                                 batch_size=batch_size, used_ratio=used_ratio, echo=click.echo)
+    click.echo(f"Seeded {result['events']} event(s), {result['ticket_types']} tier(s), "
+               f"{result['orders']} order(s) and {result['tickets']} ticket(s) "
+               f"in {time.perf_counter() - started:.1f}s.")
+    if statement:
+        with db.engine.connect() as conn, open(statement, 'wb') as f:
+            for chunk in iter_csv(synthetic.STATEMENT_HEADER,
+                                  synthetic.statement_rows(conn, *result['order_ids'])):
+                f.write(chunk)
+        click.echo(f"Statement written to {statement}.")
+
+db_cli = AppGroup('db', help='Schema migrations.')
+
+@db_cli.command('upgrade')
+@click.option('--to', 'target', type=int, help='Stop after this version.')
+def db_upgrade_command(target):
+    """Apply pending migrations in order."""
+    applied = schema.upgrade(db.engine, target=target, echo=click.echo)
+    click.echo(f"Schema at version {schema.current(db.engine)}"
+               + (f" ({len(applied)} applied)." if applied else " (nothing to do)."))
+
+@db_cli.command('current')
+def db_current_command():
+    """Show the applied and latest schema versions."""
+    click.echo(f"Applied: {schema.current(db.engine)}, latest: {schema.latest}")
+
+@db_cli.command('history')
+def db_history_command():
+    """List every migration and when it was applied."""
+    applied = {row.version: row.applied_at for row in schema.history(db.engine)}
+    for version, name, _ in schema.steps:
+        when = applied.get(version)
+        click.echo(f"{version:>4}  {'applied ' + when.strftime('%Y-%m-%d %H:%M') if when else 'pending':<26}{name}")
+
+app.cli.add_command(db_cli)
+
+# ================== APP FACTORY ==================
+
+def reset_after_fork():
+    """Run in every forked child: pooled connections and locks must not be shared with the parent."""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)  # forget the parent's sockets without closing them
+    metrics.reset()
+    tracer.after_fork()
+    data_versions.after_fork()
+
+os.register_at_fork(after_in_child=reset_after_fork)
+
+def prepare_app(migrate=None):
+    """Bring the schema up to date and return the app for a WSGI server.
+
+    There is one app, configured from the environment when this module is
+    imported (engines, pools, mail and the secret key are fixed then), so
+    this builds nothing; AUTO_MIGRATE=off skips the migration. With
+    preload_app it runs once in the gunicorn master, before fork (see
+    wsgi.py and gunicorn.conf.py).
+    """
+    if migrate is None:
+        migrate = os.environ.get("AUTO_MIGRATE", "on") == "on"
+    if migrate:
+        with app.app_context():
+            setup_db()
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()  # start workers without pooled connections
+    return app
+
 # ================== MAIN ==================
 
 if __name__ == '__main__':
-    with app.app_context():
-        setup_db()
+    # development server only; production runs wsgi:app under gunicorn or waitress
+    prepare_app()
     app.run(
-        debug=True,
+        debug=os.environ.get("FLASK_DEBUG") == "1",
         host='0.0.0.0',
         port=int(os.environ.get("PORT", 5050))
     )
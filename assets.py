@@ -0,0 +1,123 @@
+"""Static asset build: content-hashed copies plus gzip/brotli variants.
+
+    flask build-assets
+
+copies every file under static/ (except QR codes and posters) to
+static/dist/ as name.<hash>.ext, writes .gz, and .br when the optional
+brotli package is installed, beside each text asset, and lists them in
+static/dist/manifest.json. With a manifest present the app points
+url_for('static', ...) at the hashed copies, serves them with a year-long
+immutable Cache-Control, and picks the precompressed variant the client
+accepts. A source file edited after the build falls back to its plain URL
+until the next build, so a stale build never serves old content.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+SKIP_DIRS = ('qrs', 'posters', DIST)  # posters.py output is content-hashed already
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map')
+MIN_SAVING = 0.9  # keep a variant only when it is at most 90% of the original
+# in order of preference when the client accepts several
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+def compressors():
+    if brotli is not None:
+        yield 'br', lambda data: brotli.compress(data, quality=11)
+    yield 'gzip', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+
+def hashed_name(relpath, data):
+    root, ext = os.path.splitext(relpath)
+    return f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def source_files(static_folder):
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        if os.path.samefile(dirpath, static_folder):
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            yield os.path.relpath(path, static_folder).replace(os.sep, '/'), path
+
+# ================== BUILD ==================
+
+def build(static_folder, clean=False, echo=print):
+    """Write static/dist and its manifest; returns the manifest.
+
+    Hashed copies from earlier builds are kept, for pages rendered before a
+    deploy, unless clean is set.
+    """
+    out = os.path.join(static_folder, DIST)
+    manifest = {}
+    for relpath, path in source_files(static_folder):
+        with open(path, 'rb') as f:
+            data = f.read()
+        target = hashed_name(relpath, data)
+        dest = os.path.join(out, target)
+        _write(dest, data)
+        encodings, sizes = [], [len(data)]
+        if relpath.endswith(COMPRESSIBLE):
+            for encoding, compress in compressors():
+                packed = compress(data)
+                if len(packed) <= len(data) * MIN_SAVING:
+                    _write(dest + SUFFIXES[encoding], packed)
+                    encodings.append(encoding)
+                    sizes.append(len(packed))
+        stat = os.stat(path)
+        manifest[relpath] = {
+            'path': f'{DIST}/{target}',
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'encodings': encodings,
+        }
+        echo(f"  {relpath} -> {target} ({' / '.join(str(s) for s in sizes)} bytes)")
+    _write(os.path.join(out, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    if clean:
+        keep = {os.path.join(static_folder, e['path'] + suffix)
+                for e in manifest.values()
+                for suffix in [''] + [SUFFIXES[enc] for enc in e['encodings']]}
+        keep.add(os.path.join(out, MANIFEST))
+        for dirpath, _, filenames in os.walk(out):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if path not in keep:
+                    os.remove(path)
+                    echo(f"  removed {os.path.relpath(path, static_folder)}")
+    return manifest
+
+# ================== RUNTIME ==================
+
+def load_manifest(static_folder):
+    """The build's manifest without entries whose source changed since; {} if never built."""
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+    current = {}
+    for relpath, entry in manifest.items():
+        try:
+            stat = os.stat(os.path.join(static_folder, relpath))
+        except FileNotFoundError:
+            continue
+        if (stat.st_size, stat.st_mtime) != (entry['size'], entry['mtime']):
+            continue
+        if os.path.exists(os.path.join(static_folder, entry['path'])):
+            current[relpath] = entry
+    return current
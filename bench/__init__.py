@@ -0,0 +1,2 @@
+# Benchmarks and load tools. Run them from the repo root, e.g.
+#   python -m bench.scan_loadtest --help
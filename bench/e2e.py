@@ -0,0 +1,247 @@
+"""End-to-end benchmarks for the purchase, mark-paid and validation flows.
+
+Seeds a scratch database with a fixed-seed dataset of --orders orders
+(1k, 100k and 1M are the sizes we compare), then drives the app in-process
+through the Flask test client:
+
+    events          GET  /                          page render time
+    buy_get         GET  /buy/<event>               throughput
+    buy_post        POST /buy/<event>               throughput (creates orders)
+    mark_paid_qN    POST /admin/mark_paid/<order>   latency for an N-ticket order
+    validate        POST /validate                  scans per second
+
+Results print as a table and, with --json, are written in a stable format
+meant to be kept per release; --compare prints the change against one.
+
+    python -m bench.e2e --orders 1000 --json e2e-1k.json
+    python -m bench.e2e --orders 100000 --compare e2e-100k-previous.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bench.scan_loadtest import latency_summary
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--orders', type=int, default=1000, help='orders to seed (1000, 100000, 1000000)')
+    p.add_argument('--requests', type=int, default=300, help='requests per throughput flow')
+    p.add_argument('--quantities', default='1,5,10,25', help='ticket counts for mark_paid')
+    p.add_argument('--mark-paid-orders', type=int, default=20, help='orders marked paid per quantity')
+    p.add_argument('--seed', type=int, default=1, help='RNG seed for the dataset and the flows')
+    p.add_argument('--json', dest='json_path', help='also write results as JSON here')
+    p.add_argument('--compare', help='earlier --json results to compare against')
+    return p.parse_args(argv)
+
+
+# ================== SEEDING ==================
+
+def seed_dataset(n_orders, seed):
+    """setup_db() plus one synthetic event with n_orders orders (same data as `flask seed-synthetic`)."""
+    from app import app, setup_db, seed_synthetic_data
+
+    with app.app_context():
+        setup_db()
+        result = seed_synthetic_data(n_orders, seed=seed, headroom=100_000)  # never sells out mid-run
+    return result['event_ids'][0]
+
+
+# ================== FLOWS ==================
+
+def run_flow(n, request_fn):
+    """Call request_fn(i) n times; every response must be a 200 (or a redirect)."""
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for i in range(n):
+        t0 = time.perf_counter()
+        response = request_fn(i)
+        latencies.append(time.perf_counter() - t0)
+        if response.status_code >= 400:
+            errors += 1
+        response.close()
+    wall = time.perf_counter() - started
+    return {
+        'requests': n,
+        'per_s': round(n / wall, 1) if wall else 0.0,
+        'errors': errors,
+        'latency': latency_summary(latencies),
+    }
+
+
+def pending_orders(quantity, count, tier):
+    from app import db, Order, record_new_order
+
+    orders = []
+    for i in range(count):
+        order = Order(
+            buyer_name='Bench Mark Paid',
+            buyer_email='markpaid@example.com',
+            buyer_phone='254700000000',
+            payment_method='mpesa_manual',
+            payment_status='pending',
+            amount=tier.price * quantity,
+            ticket_type_id=tier.id,
+            quantity=quantity,
+        )
+        db.session.add(order)
+        record_new_order(order)
+        orders.append(order)
+    db.session.commit()
+    return [o.id for o in orders]
+
+
+def remove_qr_files(order_ids):
+    from app import basedir, Ticket
+
+    for (qr_path,) in Ticket.query.with_entities(Ticket.qr_path).filter(
+            Ticket.order_id.in_(order_ids), Ticket.qr_path.isnot(None)):
+        try:
+            os.remove(os.path.join(basedir, qr_path.lstrip('/')))
+        except FileNotFoundError:
+            pass
+
+
+def csrf_token(client, path):
+    """The CSRF token a page embeds for client's session."""
+    html = client.get(path).get_data(as_text=True)
+    return re.search(r'name="csrf_token" value="([^"]+)"', html).group(1)
+
+
+def run_flows(args, event_id, rng):
+    from app import app, db, Ticket, TicketType
+
+    app.extensions['mail'].suppress = True
+    client = app.test_client()
+    results = {}
+
+    # warm up templates and connection pools before timing anything
+    for path in ('/', f'/buy/{event_id}'):
+        client.get(path).close()
+
+    results['events'] = run_flow(args.requests, lambda i: client.get('/'))
+    results['buy_get'] = run_flow(args.requests, lambda i: client.get(f'/buy/{event_id}'))
+
+    with app.app_context():
+        tiers = TicketType.query.filter_by(event_id=event_id).order_by(TicketType.id).all()
+        tier_ids = [tt.id for tt in tiers]
+    buyer = client.application.test_client()  # own session: buy() sets read-your-writes
+    results['buy_post'] = run_flow(args.requests, lambda i: buyer.post(f'/buy/{event_id}', data={
+        'ticket_type_id': str(tier_ids[i % len(tier_ids)]),
+        'quantity': str(1 + i % 3),
+        'name': f'Bench Buyer {i}',
+        'email': f'bench{i}@example.com',
+        'phone': f'07{rng.randrange(10**8):08d}',
+        'mpesa_code': f'B{args.seed:02d}{i:07d}',
+    }))
+
+    admin = app.test_client()
+    token = csrf_token(admin, '/admin/login')  # the session keeps it after login
+    admin.post('/admin/login', data={
+        'username': os.environ.get('ADMIN_USERNAME', 'admin'),
+        'password': os.environ['ADMIN_PASSWORD'],
+        'csrf_token': token,
+    }).close()
+    for quantity in sorted({int(q) for q in args.quantities.split(',')}):
+        with app.app_context():
+            order_ids = pending_orders(quantity, args.mark_paid_orders, tiers[0])
+        try:
+            results[f'mark_paid_q{quantity}'] = run_flow(
+                len(order_ids), lambda i: admin.post(f'/admin/mark_paid/{order_ids[i]}',
+                                                   data={'csrf_token': token}))
+        finally:
+            with app.app_context():
+                remove_qr_files(order_ids)
+
+    with app.app_context():
+        codes = [code for (code,) in db.session.query(Ticket.code)
+                 .filter(Ticket.status == 'valid', Ticket.qr_path.is_(None))
+                 .order_by(Ticket.id).limit(args.requests)]
+    results['validate'] = run_flow(
+        len(codes), lambda i: client.post('/validate', data={'code': codes[i]}))
+    return results
+
+
+# ================== REPORT ==================
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(args, seed_seconds, results):
+    return {
+        'benchmark': 'e2e',
+        'version': 1,
+        'git': git_revision(),
+        'run_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'dataset': {'orders': args.orders, 'seed': args.seed, 'seed_s': round(seed_seconds, 2)},
+        'flows': results,
+    }
+
+
+def print_report(report, baseline=None):
+    print(f"orders={report['dataset']['orders']} seed={report['dataset']['seed']} "
+          f"git={report['git']} seeded in {report['dataset']['seed_s']}s")
+    print(f"{'flow':<16}{'reqs':>7}{'per_s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>5}  (ms)"
+          + ('   vs baseline p50' if baseline else ''))
+    for name, r in report['flows'].items():
+        lat = r['latency']
+        line = (f"{name:<16}{r['requests']:>7}{r['per_s']:>9}{lat['p50_ms']:>9}"
+                f"{lat['p95_ms']:>9}{lat['p99_ms']:>9}{r['errors']:>5}")
+        before = (baseline or {}).get('flows', {}).get(name)
+        if before and before['latency']['p50_ms']:
+            change = lat['p50_ms'] / before['latency']['p50_ms'] - 1
+            line += f"   {change:+.1%}"
+        print(line)
+
+
+# ================== MAIN ==================
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory(prefix='bench-e2e-') as workdir:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'tickets.db')
+        os.environ['TRACE_FILE'] = os.path.join(workdir, 'traces.jsonl')
+        os.environ.setdefault('ADMIN_PASSWORD', 'bench')
+        os.environ.setdefault('SECRET_KEY', 'bench')  # admin login needs one
+        os.environ.setdefault('MAIL_DEFAULT_SENDER', 'bench@example.com')
+        os.environ.setdefault('QUERY_LOG_LEVEL', 'ERROR')  # bulk seeding trips the slow-query log
+
+        rng = random.Random(args.seed)
+        started = time.perf_counter()
+        event_id = seed_dataset(args.orders, args.seed)
+        seed_seconds = time.perf_counter() - started
+        results = run_flows(args, event_id, rng)
+
+    report = build_report(args, seed_seconds, results)
+    print_report(report, baseline)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+    if any(r['errors'] for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Cold-start benchmark: import time and time to the first response.
+
+Each round starts a fresh interpreter against a scratch database, so
+nothing is cached in-process:
+
+    import          `python -X importtime -c "import app"`: total, the app
+                    module's own share and the heaviest top-level imports
+    prepare_app     prepare_app() on an already migrated database (a worker
+                    restart), which should skip the schema work entirely
+    first_request   GET / straight after prepare_app()
+
+The run fails (exit 1) when the median import exceeds --budget-ms, when
+prepare_app + first request exceeds --start-budget-ms, or when a module in
+LAZY_MODULES is loaded by `import app`: those are only needed to render
+QR codes, PDFs or card payments and must load on first use.
+
+    python -m bench.import_time
+    python -m bench.import_time --budget-ms 400 --json import.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+LAZY_MODULES = ('qrcode', 'PIL', 'reportlab', 'stripe')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, sys, time
+import app
+imported = time.perf_counter()
+application = app.prepare_app()
+created = time.perf_counter()
+application.test_client().get('/').close()
+served = time.perf_counter()
+print(json.dumps({
+    'prepare_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'lazy_loaded': sorted(m for m in %r if m in sys.modules),
+}))
+""" % (LAZY_MODULES,)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--rounds', type=int, default=5, help='fresh interpreters per measurement')
+    p.add_argument('--top', type=int, default=12, help='heaviest top-level imports to list')
+    p.add_argument('--budget-ms', type=float, default=350.0,
+                   help='fail when the median `import app` exceeds this')
+    p.add_argument('--start-budget-ms', type=float, default=150.0,
+                   help='fail when median prepare_app + first request exceeds this')
+    p.add_argument('--json', dest='json_path', help='also write results as JSON here')
+    return p.parse_args(argv)
+
+
+# ================== MEASUREMENT ==================
+
+def parse_importtime(stderr, module='app'):
+    """-X importtime output -> (cumulative_us, self_us, {direct import: cumulative_us}) for module."""
+    children = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        # children are printed before their parent, one indent deeper
+        if depth == 1:
+            children[name] = int(cumulative)
+        elif depth == 0:
+            if name == module:
+                return int(cumulative), int(self_us), children
+            children = {}
+    raise RuntimeError(f'{module} not found in -X importtime output')
+
+
+def run_python(args, env):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True,
+                          text=True, check=True)
+
+
+def measure(rounds, env):
+    imports, starts = [], []
+    for _ in range(rounds):
+        imports.append(parse_importtime(run_python(['-X', 'importtime', '-c', 'import app'], env).stderr))
+    for _ in range(rounds):
+        starts.append(json.loads(run_python(['-c', PROBE], env).stdout.splitlines()[-1]))
+
+    children = {}
+    for _, _, direct in imports:
+        for name, us in direct.items():
+            children.setdefault(name, []).append(us / 1000)
+    return {
+        'import_ms': round(statistics.median(c for c, _, _ in imports) / 1000, 1),
+        'app_module_ms': round(statistics.median(s for _, s, _ in imports) / 1000, 1),
+        'prepare_app_ms': round(statistics.median(s['prepare_app_ms'] for s in starts), 1),
+        'first_request_ms': round(statistics.median(s['first_request_ms'] for s in starts), 1),
+        'lazy_loaded': sorted({m for s in starts for m in s['lazy_loaded']}),
+        'imports': {name: round(statistics.median(ms), 1) for name, ms in
+                    sorted(children.items(), key=lambda kv: -statistics.median(kv[1]))},
+    }
+
+
+# ================== REPORT ==================
+
+def problems(results, args):
+    found = []
+    if results['import_ms'] > args.budget_ms:
+        found.append(f"import app took {results['import_ms']}ms (budget {args.budget_ms}ms)")
+    start_ms = results['prepare_app_ms'] + results['first_request_ms']
+    if start_ms > args.start_budget_ms:
+        found.append(f"prepare_app + first request took {start_ms:.1f}ms "
+                     f"(budget {args.start_budget_ms}ms)")
+    for name in results['lazy_loaded']:
+        found.append(f"{name} is loaded at startup; import it where it is used")
+    return found
+
+
+def print_report(results, top):
+    print(f"import app        {results['import_ms']:>8}ms  (app module itself "
+          f"{results['app_module_ms']}ms)")
+    print(f"prepare_app()     {results['prepare_app_ms']:>8}ms")
+    print(f"first request     {results['first_request_ms']:>8}ms")
+    print('heaviest imports:')
+    for name, ms in list(results['imports'].items())[:top]:
+        print(f"  {name:<28}{ms:>8}ms")
+
+
+# ================== MAIN ==================
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix='bench-import-') as workdir:
+        env = dict(os.environ)
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'tickets.db')
+        env['TRACE_FILE'] = os.path.join(workdir, 'traces.jsonl')
+        env.setdefault('MAIL_DEFAULT_SENDER', 'bench@example.com')
+        env.setdefault('QUERY_LOG_LEVEL', 'WARNING')
+        # migrate once, so every timed round is a restart against an up-to-date schema
+        run_python(['-c', 'import app; app.prepare_app()'], env)
+        results = measure(args.rounds, env)
+
+    print_report(results, args.top)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'benchmark': 'import_time', 'version': 2, **results}, f, indent=2)
+    found = problems(results, args)
+    for problem in found:
+        print(f'FAIL {problem}')
+    if found:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
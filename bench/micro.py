@@ -0,0 +1,248 @@
+"""Microbenchmarks for the per-ticket primitives.
+
+Times each primitive with perf_counter over many rounds (after a warm-up),
+then measures memory in a separate tracemalloc pass, because tracing slows
+allocation-heavy code several-fold:
+
+    ticket_code                 generate_ticket_code()
+    qr_<fmt>_box<N>             qrcode render + save to memory, PNG/SVG per box size
+    generate_qr                 the app's generate_qr(): render and write the PNG
+    email_<N>att                build_ticket_email() for an order with N tickets
+    render_ticket               ticket.html
+    render_order_<N>            order_detail.html for an order with N tickets
+
+--compare fails (exit 1) when a median is more than --max-regression slower
+than in an earlier --json run, so this can gate a release.
+
+    python -m bench.micro --json micro.json
+    python -m bench.micro --compare micro.json --max-regression 0.25
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+QR_FORMATS = ('png', 'svg')
+QR_BOX_SIZES = (5, 10, 20)
+ATTACHMENT_COUNTS = (1, 5, 25)
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--rounds', type=int, default=200, help='timed calls per benchmark')
+    p.add_argument('--min-time', type=float, default=0.5,
+                   help='keep going past --rounds until this many seconds have passed')
+    p.add_argument('--only', help='comma-separated name prefixes to run')
+    p.add_argument('--json', dest='json_path', help='also write results as JSON here')
+    p.add_argument('--compare', help='earlier --json results to compare against')
+    p.add_argument('--max-regression', type=float, default=0.2,
+                   help='allowed median slowdown vs --compare (0.2 = 20%%)')
+    return p.parse_args(argv)
+
+
+# ================== HARNESS ==================
+
+def measure(fn, rounds, min_time):
+    for _ in range(max(3, rounds // 20)):
+        fn()
+    times = []
+    deadline = time.perf_counter() + min_time
+    while len(times) < rounds or time.perf_counter() < deadline:
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+
+    alloc_rounds = max(1, min(rounds, 20))
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for _ in range(alloc_rounds):
+        fn()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'rounds': len(times),
+        'min_us': round(min(times) * 1e6, 1),
+        'median_us': round(statistics.median(times) * 1e6, 1),
+        'mean_us': round(statistics.fmean(times) * 1e6, 1),
+        'stdev_us': round(statistics.stdev(times) * 1e6, 1) if len(times) > 1 else 0.0,
+        'ops_per_s': round(1 / statistics.median(times), 1),
+        'peak_kib': round((peak - before) / 1024, 1),
+        'retained_kib_per_call': round((after - before) / 1024 / alloc_rounds, 2),
+    }
+
+
+# ================== FIXTURES ==================
+
+def seed_orders():
+    """One paid order per ATTACHMENT_COUNTS entry, with real QR files for each ticket."""
+    from app import db, setup_db, generate_ticket_code, generate_qr, Order, Ticket, TicketType
+
+    setup_db()
+    tier = TicketType.query.order_by(TicketType.id).first()
+    orders = {}
+    for n in ATTACHMENT_COUNTS:
+        order = Order(
+            buyer_name='Micro Bench',
+            buyer_email='micro@example.com',
+            buyer_phone='254700000000',
+            payment_method='mpesa_manual',
+            payment_status='paid',
+            amount=tier.price * n,
+            ticket_type_id=tier.id,
+            quantity=n,
+            mpesa_code=f'MICRO{n:05d}',
+            created_at=datetime(2025, 11, 1, 12, 0),
+        )
+        db.session.add(order)
+        db.session.flush()
+        for _ in range(n):
+            code = generate_ticket_code()
+            db.session.add(Ticket(order_id=order.id, ticket_type_id=tier.id,
+                                  code=code, qr_path=generate_qr(code)))
+        orders[n] = order.id
+    db.session.commit()
+    return orders
+
+
+def remove_qr_files():
+    from app import basedir, Ticket
+
+    for (qr_path,) in Ticket.query.with_entities(Ticket.qr_path).filter(Ticket.qr_path.isnot(None)):
+        try:
+            os.remove(os.path.join(basedir, qr_path.lstrip('/')))
+        except FileNotFoundError:
+            pass
+
+
+# ================== BENCHMARKS ==================
+
+def qr_bench(fmt, box_size):
+    import qrcode
+    import qrcode.image.svg
+
+    factory = qrcode.image.svg.SvgPathImage if fmt == 'svg' else None
+
+    def run():
+        buf = io.BytesIO()
+        qrcode.make('9F2C41D7', image_factory=factory, box_size=box_size).save(buf)
+    return run
+
+
+def benchmarks(orders):
+    """Yield (name, callable); each callable runs one operation inside the current app context."""
+    from flask import render_template
+    from app import (
+        app, db, basedir, generate_ticket_code, generate_qr, build_ticket_email,
+        order_graph_query, ticket_tier_options, Order, Ticket,
+    )
+
+    yield 'ticket_code', generate_ticket_code
+
+    for fmt in QR_FORMATS:
+        for box_size in QR_BOX_SIZES:
+            yield f'qr_{fmt}_box{box_size}', qr_bench(fmt, box_size)
+
+    def app_generate_qr():
+        os.remove(os.path.join(basedir, generate_qr('BENCHQR0').lstrip('/')))
+    yield 'generate_qr', app_generate_qr
+
+    for n, order_id in orders.items():
+        order = db.session.get(Order, order_id)
+        yield f'email_{n}att', lambda order=order: build_ticket_email(order)
+
+    ticket = (Ticket.query.options(ticket_tier_options())
+              .filter_by(order_id=orders[ATTACHMENT_COUNTS[0]]).first())
+
+    def render_ticket():
+        with app.test_request_context(f'/ticket/{ticket.code}'):
+            render_template('ticket.html', ticket=ticket)
+    yield 'render_ticket', render_ticket
+
+    for n, order_id in orders.items():
+        order = order_graph_query().filter_by(id=order_id).one()
+
+        def render_order(order=order):
+            with app.test_request_context(f'/order/{order.id}'):
+                render_template('order_detail.html', order=order)
+        yield f'render_order_{n}', render_order
+
+
+def run(args):
+    from app import app
+
+    only = tuple(args.only.split(',')) if args.only else None
+    results = {}
+    with app.app_context():
+        orders = seed_orders()
+        try:
+            for name, fn in benchmarks(orders):
+                if only and not name.startswith(only):
+                    continue
+                results[name] = measure(fn, args.rounds, args.min_time)
+        finally:
+            remove_qr_files()
+    return results
+
+
+# ================== REPORT ==================
+
+def regressions(results, baseline, max_regression):
+    problems = []
+    for name, r in results.items():
+        before = baseline.get('benchmarks', {}).get(name)
+        if before and r['median_us'] > before['median_us'] * (1 + max_regression):
+            problems.append(f"{name}: median {r['median_us']}us vs {before['median_us']}us")
+    return problems
+
+
+def print_report(results, baseline=None):
+    print(f"{'benchmark':<18}{'rounds':>8}{'median':>11}{'min':>11}{'ops/s':>11}"
+          f"{'peak':>10}{'kept':>9}" + ('   vs baseline' if baseline else ''))
+    print(f"{'':<18}{'':>8}{'(us)':>11}{'(us)':>11}{'':>11}{'(KiB)':>10}{'(KiB)':>9}")
+    for name, r in results.items():
+        line = (f"{name:<18}{r['rounds']:>8}{r['median_us']:>11}{r['min_us']:>11}"
+                f"{r['ops_per_s']:>11}{r['peak_kib']:>10}{r['retained_kib_per_call']:>9}")
+        before = (baseline or {}).get('benchmarks', {}).get(name)
+        if before and before['median_us']:
+            line += f"   {r['median_us'] / before['median_us'] - 1:+.1%}"
+        print(line)
+
+
+# ================== MAIN ==================
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory(prefix='bench-micro-') as workdir:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'tickets.db')
+        os.environ['TRACE_FILE'] = os.path.join(workdir, 'traces.jsonl')
+        os.environ.setdefault('MAIL_DEFAULT_SENDER', 'micro@example.com')
+        os.environ.setdefault('QUERY_LOG_LEVEL', 'ERROR')
+        results = run(args)
+
+    print_report(results, baseline)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'benchmark': 'micro', 'version': 1, 'benchmarks': results}, f, indent=2)
+    if baseline:
+        problems = regressions(results, baseline, args.max_regression)
+        for problem in problems:
+            print(f'FAIL {problem}')
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
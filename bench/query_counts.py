@@ -0,0 +1,179 @@
+"""Query-count regression check for the order and ticket pages.
+
+Seeds paid orders holding 1, 5 and 25 tickets, then counts the SQL
+statements each page (and the ticket email) issues for every order size.
+Eager loading keeps the count fixed, so any difference between sizes is an
+N+1 regression; a count above the view's @query_budget is one too. Exits non-zero
+on either, which makes it usable as a CI step.
+
+    python -m bench.query_counts
+    python -m bench.query_counts --sizes 1,10,100 --json counts.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+CHECKS = ('order_detail', 'ticket_detail', 'validate_ticket', 'send_ticket_email')
+
+# budgets for views come from their @query_budget; these cover everything else
+EXTRA_BUDGETS = {
+    'send_ticket_email': 1,
+}
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--sizes', default='1,5,25', help='tickets per seeded order')
+    p.add_argument('--json', dest='json_path', help='also write the counts as JSON here')
+    return p.parse_args(argv)
+
+
+# ================== SEEDING ==================
+
+def seed_orders(sizes):
+    from app import db, Event, TicketType, Order, Ticket
+
+    db.create_all()
+    event = Event(
+        name='Query Count Check',
+        description='Seeded by bench.query_counts',
+        location='localhost',
+        start_time=datetime(2025, 12, 6, 15, 0),
+        end_time=datetime(2025, 12, 7, 5, 0),
+    )
+    db.session.add(event)
+    db.session.flush()
+    tt = TicketType(event_id=event.id, name='Regular', price=1000,
+                    total_quantity=sum(sizes), sold_quantity=sum(sizes))
+    db.session.add(tt)
+    db.session.flush()
+
+    seeded = {}
+    for size in sizes:
+        order = Order(
+            buyer_name='Query Count',
+            buyer_email='querycount@example.com',
+            buyer_phone='254700000000',
+            payment_method='mpesa_manual',
+            payment_status='paid',
+            amount=tt.price * size,
+            ticket_type_id=tt.id,
+            quantity=size,
+        )
+        db.session.add(order)
+        db.session.flush()
+        codes = [f'Q{size:03d}{i:04d}' for i in range(size)]
+        db.session.execute(
+            db.insert(Ticket),
+            [{'order_id': order.id, 'ticket_type_id': tt.id, 'code': c, 'status': 'valid'}
+             for c in codes]
+        )
+        seeded[size] = (order.id, codes)
+    db.session.commit()
+    return seeded
+
+
+# ================== COUNTING ==================
+
+@contextmanager
+def count_statements(engines):
+    from sqlalchemy import event
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', record)
+
+
+def measure(sizes):
+    from app import app, db, Order, send_ticket_email
+
+    app.extensions['mail'].suppress = True
+    client = app.test_client()
+    results = {name: {} for name in CHECKS}
+    with app.app_context():
+        seeded = seed_orders(sizes)
+        engines = list(db.engines.values())
+        for size, (order_id, codes) in seeded.items():
+            with count_statements(engines) as stmts:
+                client.get(f'/order/{order_id}').close()
+            results['order_detail'][size] = len(stmts)
+
+            with count_statements(engines) as stmts:
+                client.get(f'/ticket/{codes[-1]}').close()
+            results['ticket_detail'][size] = len(stmts)
+
+            with count_statements(engines) as stmts:
+                client.post('/validate', data={'code': codes[0]}).close()
+            results['validate_ticket'][size] = len(stmts)
+
+            order = db.session.get(Order, order_id)
+            with count_statements(engines) as stmts:
+                send_ticket_email(order)
+            results['send_ticket_email'][size] = len(stmts)
+            db.session.remove()
+    return results
+
+
+def budgets():
+    from app import app
+
+    found = dict(EXTRA_BUDGETS)
+    for name in CHECKS:
+        budget = getattr(app.view_functions.get(name), 'query_budget', None)
+        if budget is not None:
+            found[name] = budget
+    return found
+
+
+def regressions(results, limits):
+    problems = []
+    for name, counts in results.items():
+        if len(set(counts.values())) > 1:
+            problems.append(f'{name}: query count grows with tickets {counts}')
+        worst = max(counts.values())
+        if name in limits and worst > limits[name]:
+            problems.append(f'{name}: {worst} queries, budget is {limits[name]}')
+    return problems
+
+
+# ================== MAIN ==================
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = sorted({int(s) for s in args.sizes.split(',')})
+    with tempfile.TemporaryDirectory(prefix='query-counts-') as workdir:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'tickets.db')
+        os.environ.setdefault('MAIL_DEFAULT_SENDER', 'querycount@example.com')
+        os.environ.setdefault('QUERY_LOG_LEVEL', 'WARNING')
+        results = measure(sizes)
+        limits = budgets()
+
+    print(f"{'check':<20}" + ''.join(f'{f"{s} tkt":>9}' for s in sizes) + f"{'budget':>9}")
+    for name, counts in results.items():
+        print(f'{name:<20}' + ''.join(f'{counts[s]:>9}' for s in sizes)
+              + f"{limits.get(name, '-'):>9}")
+    problems = regressions(results, limits)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'counts': results, 'budgets': limits, 'problems': problems}, f, indent=2)
+    for problem in problems:
+        print(f'FAIL {problem}')
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
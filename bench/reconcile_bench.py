@@ -0,0 +1,183 @@
+"""Benchmark M-Pesa statement reconciliation on large statements.
+
+Builds a synthetic Paybill statement (CSV and XLSX) with --lines receipts,
+seeds a scratch SQLite database with matching pending orders (plus amount
+mismatches, duplicate codes and unknown receipts), then times each stage:
+statement parsing, loading pending codes and the hash join. Peak Python
+memory is measured with tracemalloc in a separate pass.
+
+    python -m bench.reconcile_bench --lines 100000
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+HEADER = ['Receipt No.', 'Completion Time', 'Details', 'Transaction Status',
+          'Paid In', 'Withdrawn', 'Balance', 'Other Party Info']
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--lines', type=int, default=100_000, help='statement receipts')
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--json', dest='json_path', help='also write results as JSON here')
+    return p.parse_args(argv)
+
+
+# ================== DATA ==================
+
+def build_statement(n_lines, rng):
+    """Return (rows, orders): statement rows and the pending orders they should hit."""
+    start = datetime(2025, 12, 1, 8, 0)
+    rows, orders = [], []
+    for i in range(n_lines):
+        code = f'T{i:09d}'
+        amount = rng.choice((1000, 1500, 2000, 3000))
+        roll = rng.random()
+        if roll < 0.90:
+            orders.append((code, amount))           # clean match
+        elif roll < 0.94:
+            orders.append((code, amount + 500))     # customer paid the wrong amount
+        elif roll < 0.96:
+            orders.append((code, amount))           # two orders claim one receipt
+            orders.append((code, amount))
+        # remaining receipts have no order at all
+        rows.append([
+            code,
+            (start + timedelta(seconds=i * 7)).strftime('%d-%m-%Y %H:%M:%S'),
+            'Pay Bill Online',
+            'Completed',
+            f'{amount:,}.00',
+            '',
+            '',
+            f'2547{rng.randrange(10**8):08d} - Customer {i}',
+        ])
+    # a slice of the statement exported twice
+    rows.extend(rows[:n_lines // 100])
+    return rows, orders
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        f.write('Organization Name:,Mtwapa Greenyard Resort\n')
+        f.write('Time Period:,01-12-2025 - 07-12-2025\n\n')
+        w = csv.writer(f)
+        w.writerow(HEADER)
+        w.writerows(rows)
+
+
+def write_xlsx(path, rows):
+    from exports import iter_xlsx
+
+    with open(path, 'wb') as f:
+        for chunk in iter_xlsx(HEADER, rows, sheet_name='Statement'):
+            f.write(chunk)
+
+
+def seed_orders(orders):
+    from app import app, db, Order
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(Order), [
+            {
+                'buyer_name': 'Bench Buyer',
+                'buyer_email': 'bench@example.com',
+                'buyer_phone': '254700000000',
+                'payment_method': 'mpesa_manual',
+                'payment_status': 'pending',
+                'mpesa_code': code,
+                'amount': amount,
+                'ticket_type_id': 1,
+                'quantity': 1,
+            }
+            for code, amount in orders
+        ])
+        db.session.commit()
+
+
+# ================== STAGES ==================
+
+def timed(fn):
+    started = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - started
+
+
+def peak_kib(fn):
+    # separate pass: tracemalloc slows allocation-heavy code several-fold
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak // 1024
+
+
+def run(args):
+    from reconcile import iter_statement_rows, iter_statement_lines, reconcile
+    from app import app, pending_mpesa_codes
+
+    rng = random.Random(args.seed)
+    rows, orders = build_statement(args.lines, rng)
+    workdir = os.path.dirname(os.environ['DATABASE_URL'][len('sqlite:///'):])
+    csv_path = os.path.join(workdir, 'statement.csv')
+    xlsx_path = os.path.join(workdir, 'statement.xlsx')
+    write_csv(csv_path, rows)
+    write_xlsx(xlsx_path, rows)
+    seed_orders(orders)
+    del rows
+
+    results = {'lines': args.lines, 'orders': len(orders), 'stages': {}}
+
+    def parse(path):
+        with open(path, 'rb') as f:
+            return sum(1 for _ in iter_statement_lines(iter_statement_rows(path, f)))
+
+    for label, path in (('parse_csv', csv_path), ('parse_xlsx', xlsx_path)):
+        count, elapsed = timed(lambda: parse(path))
+        results['stages'][label] = {'seconds': elapsed, 'peak_kib': peak_kib(lambda: parse(path)),
+                                    'lines_per_s': count / elapsed}
+
+    with app.app_context():
+        _, elapsed = timed(pending_mpesa_codes)
+        results['stages']['load_pending'] = {'seconds': elapsed,
+                                             'peak_kib': peak_kib(pending_mpesa_codes)}
+
+        for label, path in (('reconcile_csv', csv_path), ('reconcile_xlsx', xlsx_path)):
+            def full():
+                with open(path, 'rb') as f:
+                    return reconcile(iter_statement_lines(iter_statement_rows(path, f)),
+                                     pending_mpesa_codes())
+            result, elapsed = timed(full)
+            results['stages'][label] = {'seconds': elapsed, 'peak_kib': peak_kib(full),
+                                        'lines_per_s': result['lines'] / elapsed}
+        results['buckets'] = {k: len(v) for k, v in result.items() if k != 'lines'}
+    return results
+
+
+# ================== MAIN ==================
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix='reconcile-bench-') as workdir:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'tickets.db')
+        results = run(args)
+
+    print(f"statement lines={results['lines']} pending orders={results['orders']}")
+    for stage, r in results['stages'].items():
+        rate = f"{r['lines_per_s']:>12,.0f} lines/s" if 'lines_per_s' in r else ' ' * 20
+        print(f"{stage:<16}{r['seconds']:>8.3f}s {rate}  peak {r['peak_kib']:>8,} KiB")
+    print('buckets: ' + ', '.join(f'{k}={v}' for k, v in results['buckets'].items()))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
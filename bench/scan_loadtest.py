@@ -0,0 +1,265 @@
+"""Gate scanning load test for the /validate route.
+
+Seeds an event with a configurable number of tickets, serves the app on a
+local threaded server and drives M concurrent scanner clients at it with a
+mix of valid (first scan), duplicate (re-scan) and invalid codes. Reports
+throughput and latency percentiles per scan kind.
+
+    python -m bench.scan_loadtest --tickets 5000 --scanners 8 --duration 20
+
+By default everything runs against a scratch SQLite file, so tickets.db is
+never touched. To load an already running server (e.g. under gunicorn), export
+the same DATABASE_URL the server uses and pass --url.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+SCAN_KINDS = ('valid', 'duplicate', 'invalid')
+
+# what /validate should answer for each kind of scan
+EXPECTED = {
+    'valid': 'ok',
+    'duplicate': 'used',
+    'invalid': 'invalid',
+}
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--tickets', type=int, default=2000, help='tickets to seed')
+    p.add_argument('--scanners', type=int, default=8, help='concurrent scanner clients')
+    p.add_argument('--duration', type=float, default=15.0, help='seconds to run')
+    p.add_argument('--mix', default='80,15,5',
+                   help='valid,duplicate,invalid weights (default 80,15,5)')
+    p.add_argument('--seed', type=int, default=1, help='RNG seed for codes and scan mix')
+    p.add_argument('--url', help='base URL of a running server instead of a local one')
+    p.add_argument('--json', dest='json_path', help='also write the report as JSON here')
+    return p.parse_args(argv)
+
+
+# ================== SEEDING ==================
+
+def seed_tickets(n_tickets, rng):
+    from app import app, db, Event, TicketType, Order, Ticket
+
+    codes = set()
+    while len(codes) < n_tickets:
+        codes.add(f'{rng.getrandbits(32):08X}')
+    codes = sorted(codes)
+    rng.shuffle(codes)
+
+    with app.app_context():
+        db.create_all()
+        event = Event(
+            name='Gate Load Test',
+            description='Seeded by bench.scan_loadtest',
+            location='localhost',
+            start_time=datetime(2025, 12, 6, 15, 0),
+            end_time=datetime(2025, 12, 7, 5, 0),
+        )
+        db.session.add(event)
+        db.session.flush()
+        tt = TicketType(event_id=event.id, name='Regular', price=1000,
+                        total_quantity=n_tickets, sold_quantity=n_tickets)
+        db.session.add(tt)
+        db.session.flush()
+        order = Order(
+            buyer_name='Load Test',
+            buyer_email='loadtest@example.com',
+            buyer_phone='254700000000',
+            payment_method='mpesa_manual',
+            payment_status='paid',
+            amount=tt.price * n_tickets,
+            ticket_type_id=tt.id,
+            quantity=n_tickets,
+        )
+        db.session.add(order)
+        db.session.flush()
+        db.session.execute(
+            db.insert(Ticket),
+            [{'order_id': order.id, 'ticket_type_id': tt.id, 'code': c, 'status': 'valid'}
+             for c in codes]
+        )
+        db.session.commit()
+    return codes
+
+
+def start_local_server():
+    from werkzeug.serving import make_server
+    from app import app
+
+    # per-request access logs would dominate the run
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.port}'
+
+
+# ================== SCANNERS ==================
+
+def classify(response):
+    if response.status_code != 200:
+        return 'error'
+    text = response.text
+    if 'Invalid ticket' in text:
+        return 'invalid'
+    if 'already used' in text:
+        return 'used'
+    if 'Valid ticket' in text:
+        return 'ok'
+    return 'error'
+
+
+def run_scanner(idx, base_url, codes, weights, seed, stop_at, results):
+    """Scan until stop_at; each scanner owns its slice of codes so valid scans never race."""
+    rng = random.Random(seed * 1000 + idx)
+    fresh = list(codes)
+    scanned = []
+    session = requests.Session()
+    url = base_url.rstrip('/') + '/validate'
+    samples = []
+
+    while time.monotonic() < stop_at:
+        kind = rng.choices(SCAN_KINDS, weights)[0]
+        if kind == 'valid' and not fresh:
+            kind = 'duplicate'
+        if kind == 'duplicate' and not scanned:
+            kind = 'valid' if fresh else 'invalid'
+
+        if kind == 'valid':
+            code = fresh.pop()
+        elif kind == 'duplicate':
+            code = rng.choice(scanned)
+        else:
+            # 'X' is not a hex digit, so these never collide with seeded codes
+            code = f'X{rng.getrandbits(28):07X}'
+
+        started = time.perf_counter()
+        try:
+            outcome = classify(session.post(url, data={'code': code}, timeout=30))
+        except requests.RequestException:
+            outcome = 'error'
+        elapsed = time.perf_counter() - started
+
+        if kind == 'valid' and outcome == 'ok':
+            scanned.append(code)
+        samples.append((kind, elapsed, outcome))
+
+    results[idx] = samples
+
+
+# ================== REPORT ==================
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def latency_summary(latencies):
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 2),
+        'p90_ms': round(percentile(values, 90) * 1000, 2),
+        'p95_ms': round(percentile(values, 95) * 1000, 2),
+        'p99_ms': round(percentile(values, 99) * 1000, 2),
+        'max_ms': round((values[-1] if values else 0.0) * 1000, 2),
+    }
+
+
+def build_report(samples, wall_seconds, args):
+    report = {
+        'tickets': args.tickets,
+        'scanners': args.scanners,
+        'duration_s': round(wall_seconds, 2),
+        'mix': args.mix,
+        'total_scans': len(samples),
+        'scans_per_s': round(len(samples) / wall_seconds, 1) if wall_seconds else 0.0,
+        'errors': sum(1 for _, _, outcome in samples if outcome == 'error'),
+        'unexpected': sum(1 for kind, _, outcome in samples
+                          if outcome != 'error' and outcome != EXPECTED[kind]),
+        'latency': {'all': latency_summary([s[1] for s in samples])},
+    }
+    for kind in SCAN_KINDS:
+        report['latency'][kind] = latency_summary([s[1] for s in samples if s[0] == kind])
+    return report
+
+
+def print_report(report):
+    print(f"scanners={report['scanners']} tickets={report['tickets']} "
+          f"mix={report['mix']} duration={report['duration_s']}s")
+    print(f"scans={report['total_scans']} throughput={report['scans_per_s']}/s "
+          f"errors={report['errors']} unexpected={report['unexpected']}")
+    print(f"{'kind':<10}{'count':>8}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for kind, lat in report['latency'].items():
+        print(f"{kind:<10}{lat['count']:>8}{lat['p50_ms']:>9}{lat['p90_ms']:>9}"
+              f"{lat['p95_ms']:>9}{lat['p99_ms']:>9}{lat['max_ms']:>9}")
+
+
+# ================== MAIN ==================
+
+def main(argv=None):
+    args = parse_args(argv)
+    weights = [float(w) for w in args.mix.split(',')]
+    if len(weights) != 3 or sum(weights) <= 0:
+        sys.exit('--mix needs three non-negative weights, e.g. 80,15,5')
+
+    scratch_dir = None
+    if args.url:
+        if 'DATABASE_URL' not in os.environ:
+            sys.exit('--url needs DATABASE_URL set to the database the server uses')
+    else:
+        scratch_dir = tempfile.TemporaryDirectory(prefix='scan-loadtest-')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(scratch_dir.name, 'tickets.db')
+
+    rng = random.Random(args.seed)
+    codes = seed_tickets(args.tickets, rng)
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server, base_url = start_local_server()
+
+    results = [None] * args.scanners
+    stop_at = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(
+            target=run_scanner,
+            args=(i, base_url, codes[i::args.scanners], weights, args.seed, stop_at, results)
+        )
+        for i in range(args.scanners)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    if server:
+        server.shutdown()
+    if scratch_dir:
+        scratch_dir.cleanup()
+
+    samples = [s for per_scanner in results for s in per_scanner]
+    report = build_report(samples, wall, args)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
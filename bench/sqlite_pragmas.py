@@ -0,0 +1,157 @@
+"""Mixed read/write throughput with and without the SQLite connection profile.
+
+Runs the same workload twice against a fresh scratch database, once with
+SQLITE_PROFILE=off (SQLite defaults: rollback journal, synchronous=FULL) and
+once with the production profile (WAL, synchronous=NORMAL, busy_timeout,
+cache/mmap/temp_store). Readers hit the events, order and ticket pages while
+writers place orders through buy() and scan tickets at /validate.
+
+    python -m bench.sqlite_pragmas --readers 8 --writers 4 --duration 10
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from bench.scan_loadtest import latency_summary
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    p.add_argument('--readers', type=int, default=8)
+    p.add_argument('--writers', type=int, default=4)
+    p.add_argument('--duration', type=float, default=10.0)
+    p.add_argument('--tickets', type=int, default=2000)
+    p.add_argument('--seed', type=int, default=1)
+    p.add_argument('--json', dest='json_path', help='also write results as JSON here')
+    p.add_argument('--profile', help=argparse.SUPPRESS)  # set when running as a worker
+    return p.parse_args(argv)
+
+
+# ================== WORKER ==================
+
+def seed(n_tickets, rng):
+    from app import app, db, setup_db, Order, Ticket, TicketType
+
+    with app.app_context():
+        setup_db()
+        tt = TicketType.query.first()
+        db.session.execute(db.insert(Order), [
+            {'buyer_name': f'Buyer {i}', 'buyer_email': '', 'buyer_phone': '254700000000',
+             'payment_method': 'mpesa_manual', 'payment_status': 'paid',
+             'amount': tt.price, 'ticket_type_id': tt.id, 'quantity': 1}
+            for i in range(n_tickets)
+        ])
+        codes = [f'{i:08X}' for i in rng.sample(range(16 ** 8), n_tickets)]
+        db.session.execute(db.insert(Ticket), [
+            {'order_id': i + 1, 'ticket_type_id': tt.id, 'code': code}
+            for i, code in enumerate(codes)
+        ])
+        db.session.commit()
+        return tt.event_id, tt.id, codes
+
+
+def reader(client, rng, n_orders, codes, stop_at, samples):
+    while time.monotonic() < stop_at:
+        roll = rng.random()
+        if roll < 0.4:
+            url = '/'
+        elif roll < 0.7:
+            url = f'/order/{rng.randrange(1, n_orders + 1)}'
+        else:
+            url = f'/ticket/{rng.choice(codes)}'
+        started = time.perf_counter()
+        status = client.get(url).status_code
+        samples.append(('read', time.perf_counter() - started, status == 200))
+
+
+def writer(client, rng, event_id, tier_id, codes, stop_at, samples):
+    while time.monotonic() < stop_at:
+        started = time.perf_counter()
+        if rng.random() < 0.5 and codes:
+            status = client.post('/validate', data={'code': codes.pop()}).status_code
+        else:
+            status = client.post(f'/buy/{event_id}', data={
+                'ticket_type_id': tier_id, 'quantity': 1, 'name': 'Bench Buyer',
+                'email': '', 'phone': '254700000000',
+            }).status_code
+        samples.append(('write', time.perf_counter() - started, status == 200))
+
+
+def run_worker(args):
+    from app import app
+
+    rng = random.Random(args.seed)
+    event_id, tier_id, codes = seed(args.tickets, rng)
+    # scans must not race each other, so every writer owns a slice of codes
+    scan_slices = [codes[i::args.writers] for i in range(args.writers)]
+
+    samples = []
+    stop_at = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(target=reader, args=(app.test_client(), random.Random(args.seed + i),
+                                              args.tickets, codes, stop_at, samples))
+        for i in range(args.readers)
+    ] + [
+        threading.Thread(target=writer, args=(app.test_client(), random.Random(args.seed + 100 + i),
+                                              event_id, tier_id, scan_slices[i], stop_at, samples))
+        for i in range(args.writers)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    result = {'profile': args.profile}
+    for kind in ('read', 'write'):
+        ok = [s[1] for s in samples if s[0] == kind and s[2]]
+        result[kind] = {
+            'per_s': round(len(ok) / wall, 1),
+            'errors': sum(1 for s in samples if s[0] == kind and not s[2]),
+            'latency': latency_summary(ok),
+        }
+    print(json.dumps(result))
+
+
+# ================== DRIVER ==================
+
+def run_variant(profile, args):
+    with tempfile.TemporaryDirectory(prefix='sqlite-bench-') as workdir:
+        env = dict(os.environ)
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'tickets.db')
+        env['SQLITE_PROFILE'] = profile
+        cmd = [sys.executable, '-m', 'bench.sqlite_pragmas', '--profile', profile,
+               '--readers', str(args.readers), '--writers', str(args.writers),
+               '--duration', str(args.duration), '--tickets', str(args.tickets),
+               '--seed', str(args.seed)]
+        out = subprocess.run(cmd, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile:
+        run_worker(args)
+        return
+
+    results = [run_variant('off', args), run_variant('production', args)]
+    print(f"readers={args.readers} writers={args.writers} duration={args.duration}s")
+    print(f"{'profile':<12}{'reads/s':>9}{'p95 ms':>9}{'err':>6}{'writes/s':>10}{'p95 ms':>9}{'err':>6}")
+    for r in results:
+        print(f"{r['profile']:<12}{r['read']['per_s']:>9}{r['read']['latency']['p95_ms']:>9}"
+              f"{r['read']['errors']:>6}{r['write']['per_s']:>10}"
+              f"{r['write']['latency']['p95_ms']:>9}{r['write']['errors']:>6}")
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
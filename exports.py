@@ -0,0 +1,133 @@
+"""Streaming spreadsheet writers.
+
+Both writers take a header and an iterator of row tuples and yield bytes in
+chunks, so a response can stream hundreds of thousands of rows while only
+one chunk is held in memory at a time.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+CHUNK_ROWS = 1000
+# a CSV cell starting with one of these is a formula to Excel and LibreOffice
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# characters XML 1.0 forbids even escaped; one in a cell makes Excel reject the file
+XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)
+
+# ================== CSV ==================
+
+def _csv_cell(value):
+    """Cell text with buyer-typed formulas defused by a leading quote, shown as text."""
+    text = _cell_text(value)
+    if isinstance(value, str) and text.startswith(FORMULA_PREFIXES):
+        return "'" + text
+    return text
+
+def iter_csv(header, rows, chunk_rows=CHUNK_ROWS):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    # BOM so Excel opens UTF-8 names correctly
+    buf.write('\ufeff')
+    writer.writerow(header)
+    for i, row in enumerate(rows, 1):
+        writer.writerow([_csv_cell(v) for v in row])
+        if i % chunk_rows == 0:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode('utf-8')
+
+# ================== XLSX ==================
+
+class _ChunkSink:
+    """Write-only, unseekable file object; zipfile then streams with data descriptors."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def _xml_text(value):
+    return escape(XML_ILLEGAL.sub('', _cell_text(value)))
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            cells.append(f'<c t="inlineStr"><is><t>{_xml_text(value)}</t></is></c>')
+        else:
+            cells.append(f'<c><v>{value}</v></c>')
+    return f'<row>{"".join(cells)}</row>'
+
+def iter_xlsx(header, rows, sheet_name='Sheet1', chunk_rows=CHUNK_ROWS):
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        zf.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        zf.writestr('xl/workbook.xml', XLSX_WORKBOOK.format(name=_xml_text(sheet_name[:31])))
+        zf.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                        b'<sheetData>')
+            sheet.write(_xlsx_row(header).encode('utf-8'))
+            for i, row in enumerate(rows, 1):
+                sheet.write(_xlsx_row(row).encode('utf-8'))
+                if i % chunk_rows == 0:
+                    yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
@@ -0,0 +1,30 @@
+"""Gunicorn settings: gunicorn -c gunicorn.conf.py wsgi:app
+
+Throughput scales with cores through worker processes; threads per worker
+cover requests that wait on the database or SMTP. Keep
+workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) under PostgreSQL's max_connections.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', 5050)}")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# behind a reverse proxy that reuses upstream connections
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+
+# import the app and run migrations once in the master; workers fork from it
+# (app.reset_after_fork gives each worker its own DB connections)
+preload_app = True
+
+# recycle workers now and then so slow leaks never add up
+max_requests = 2000
+max_requests_jitter = 200
+
+# heartbeat files on tmpfs: a slow disk must not get workers killed
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", '-')
@@ -0,0 +1,202 @@
+"""Prometheus text-format metrics without a client library.
+
+Updates are lock-free: every thread writes to its own shard (a plain dict)
+and only a scrape walks and sums the shards. The registry lock is taken
+when a thread makes its first update and when a finished thread's shard
+is folded into the retired totals, never per update.
+
+Values are per process. Under several gunicorn workers, scrape each worker
+or aggregate in Prometheus with sum() by the worker's instance label.
+"""
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class _ShardOwner:
+    """Lives in a thread-local; its finalizer runs when the thread ends."""
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _merge(into, shard):
+    for key, value in shard.items():
+        if isinstance(value, list):
+            row = into.get(key)
+            if row is None:
+                into[key] = list(value)
+            else:
+                for i, v in enumerate(value):
+                    row[i] += v
+        else:
+            into[key] = into.get(key, 0) + value
+
+# ================== METRICS ==================
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, registry, name, help, labels=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def inc(self, *labelvalues, amount=1):
+        shard = self.registry.shard()
+        key = (self.name, labelvalues)
+        shard[key] = shard.get(key, 0) + amount
+
+    def samples(self, values):
+        for (_, labelvalues), value in sorted(values.items(), key=lambda kv: kv[0][1]):
+            yield f'{self.name}{_labels(self.labels, labelvalues)} {_number(value)}'
+
+class Gauge(Counter):
+    """A gauge built from per-thread deltas: inc() and dec() may run on different threads."""
+    kind = 'gauge'
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+    @contextmanager
+    def track(self, *labelvalues):
+        self.inc(*labelvalues)
+        try:
+            yield
+        finally:
+            self.dec(*labelvalues)
+
+class Histogram(Counter):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labelvalues):
+        # row: one count per bucket, then the +Inf overflow, then the sum
+        shard = self.registry.shard()
+        key = (self.name, labelvalues)
+        row = shard.get(key)
+        if row is None:
+            row = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    @contextmanager
+    def time(self, *labelvalues):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labelvalues)
+
+    def samples(self, values):
+        bounds = self.buckets + (float('inf'),)
+        for (_, labelvalues), row in sorted(values.items(), key=lambda kv: kv[0][1]):
+            cumulative = 0
+            for bound, count in zip(bounds, row):
+                cumulative += count
+                le = (('le', _number(bound)),)
+                yield f'{self.name}_bucket{_labels(self.labels, labelvalues, le)} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labels, labelvalues)} {_number(row[-1])}'
+            yield f'{self.name}_count{_labels(self.labels, labelvalues)} {cumulative}'
+
+# ================== REGISTRY ==================
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._live = {}
+        self._retired = {}
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(self, name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._register(Gauge(self, name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, help, labels, buckets))
+
+    def _register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """Register fn() -> [(name, kind, help, [(labels_dict, value), ...]), ...], run per scrape."""
+        self.collectors.append(fn)
+        return fn
+
+    def reset(self):
+        """Start from zero, e.g. in a forked worker that inherited its parent's counts and lock."""
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._live = {}
+        self._retired = {}
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            pass
+        shard = {}
+        owner = _ShardOwner()
+        self._local.shard = shard
+        self._local.owner = owner
+        with self._lock:
+            self._live[id(owner)] = shard
+        weakref.finalize(owner, self._retire, id(owner))
+        return shard
+
+    def _retire(self, owner_id):
+        with self._lock:
+            _merge(self._retired, self._live.pop(owner_id, {}))
+
+    def snapshot(self):
+        totals = {}
+        with self._lock:
+            _merge(totals, self._retired)
+            shards = list(self._live.values())
+        for shard in shards:
+            # dict() copies in one step under the GIL, so the owner can keep writing
+            _merge(totals, dict(shard))
+        return totals
+
+    def render(self):
+        totals = self.snapshot()
+        by_metric = {}
+        for key, value in totals.items():
+            by_metric.setdefault(key[0], {})[key] = value
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples(by_metric.get(metric.name, {})))
+        for collect in self.collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_labels(labels.keys(), labels.values())} {_number(value)}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,184 @@
+"""Versioned schema migrations.
+
+Steps are registered in order with ``@schema.migration(version, name)`` and
+applied by ``schema.upgrade(engine)``; the highest applied version is kept in
+the schema_version table. A step may span several transactions (one per
+index build), so every step must be safe to re-run after a partial failure:
+the helpers on MigrationContext all skip work that is already done.
+
+Index builds never hold one long transaction. PostgreSQL uses CREATE INDEX
+CONCURRENTLY, so reads and writes carry on during the build. SQLite cannot
+build online, but each index commits on its own: under WAL readers are never
+blocked and writers wait (busy_timeout) for one index at most.
+
+On PostgreSQL, connections used while migrating drop the app's
+statement_timeout, since an index build or backfill on a large table may run
+for minutes, and wait at most LOCK_TIMEOUT_MS for a lock instead: DDL queued
+behind a long transaction would otherwise stall every query queued behind it.
+"""
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table,
+    event, inspect, select, text,
+)
+
+LOCK_TIMEOUT_MS = 10_000
+
+version_metadata = MetaData()
+schema_version = Table(
+    'schema_version', version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(200), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+def _run_setting(dbapi_connection, sql):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(sql)
+    cursor.close()
+    dbapi_connection.commit()  # session-level SETs roll back with an aborted transaction
+
+@contextmanager
+def migration_timeouts(engine, lock_timeout_ms=LOCK_TIMEOUT_MS):
+    """Apply the migration timeouts (see module docstring) to connections checked out meanwhile."""
+    if engine.dialect.name != 'postgresql':
+        yield
+        return
+
+    def lift(dbapi_connection, connection_record, connection_proxy):
+        _run_setting(dbapi_connection,
+                     f"SET statement_timeout = 0; SET lock_timeout = {int(lock_timeout_ms)}")
+        connection_record.info['migration_timeouts'] = True
+
+    def restore(dbapi_connection, connection_record):
+        # back to the values the app connected with (its -c options)
+        if connection_record.info.pop('migration_timeouts', False) and dbapi_connection is not None:
+            _run_setting(dbapi_connection, "RESET statement_timeout; RESET lock_timeout")
+
+    event.listen(engine, 'checkout', lift)
+    event.listen(engine, 'checkin', restore)
+    try:
+        yield
+    finally:
+        event.remove(engine, 'checkout', lift)
+        event.remove(engine, 'checkin', restore)
+
+class MigrationContext:
+    def __init__(self, engine, echo=print):
+        self.engine = engine
+        self.echo = echo
+
+    @property
+    def dialect(self):
+        return self.engine.dialect.name
+
+    def execute(self, sql, params=None):
+        with self.engine.begin() as conn:
+            conn.execute(text(sql) if isinstance(sql, str) else sql, params or {})
+
+    def has_table(self, table):
+        return inspect(self.engine).has_table(table)
+
+    def has_column(self, table, column):
+        return any(c['name'] == column for c in inspect(self.engine).get_columns(table))
+
+    def has_index(self, table, name):
+        return any(ix['name'] == name for ix in inspect(self.engine).get_indexes(table))
+
+    def add_column(self, table, column):
+        """Add a nullable model Column to an existing table."""
+        if self.has_column(table, column.name):
+            return
+        ddl = column.type.compile(dialect=self.engine.dialect)
+        self.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column.name}" {ddl}')
+
+    def create_index(self, name, table, columns, unique=False):
+        """Build one index without holding a long transaction (see module docstring)."""
+        cols = ', '.join(f'"{c}"' for c in columns)
+        kind = 'UNIQUE INDEX' if unique else 'INDEX'
+        started = time.perf_counter()
+        if self.dialect == 'postgresql':
+            with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                # a failed concurrent build leaves an INVALID index behind; rebuild it
+                invalid = conn.execute(text(
+                    "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                    "WHERE c.relname = :name AND NOT i.indisvalid"
+                ), {'name': name}).scalar()
+                if invalid:
+                    conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+                conn.execute(text(
+                    f'CREATE {kind} CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" ({cols})'
+                ))
+        else:
+            if self.has_index(table, name):
+                return
+            self.execute(f'CREATE {kind} IF NOT EXISTS "{name}" ON "{table}" ({cols})')
+        self.echo(f"    index {name} on {table}({', '.join(columns)}) "
+                  f"in {time.perf_counter() - started:.2f}s")
+
+class Migrations:
+    def __init__(self):
+        self.steps = []
+
+    def migration(self, version, name):
+        def register(fn):
+            if self.steps and version <= self.steps[-1][0]:
+                raise ValueError(f"Migration {version} must be newer than {self.steps[-1][0]}.")
+            self.steps.append((version, name, fn))
+            return fn
+        return register
+
+    @property
+    def latest(self):
+        return self.steps[-1][0] if self.steps else 0
+
+    def current(self, engine):
+        if not inspect(engine).has_table('schema_version'):
+            return 0
+        with engine.connect() as conn:
+            return conn.execute(
+                select(schema_version.c.version).order_by(schema_version.c.version.desc()).limit(1)
+            ).scalar() or 0
+
+    def history(self, engine):
+        if not inspect(engine).has_table('schema_version'):
+            return []
+        with engine.connect() as conn:
+            return conn.execute(
+                select(schema_version).order_by(schema_version.c.version)
+            ).all()
+
+    def pending(self, engine, target=None):
+        current = self.current(engine)
+        return [s for s in self.steps
+                if s[0] > current and (target is None or s[0] <= target)]
+
+    def upgrade(self, engine, target=None, echo=print):
+        # the common case on every worker start: one lookup, no DDL or inspection
+        if self.current(engine) >= (self.latest if target is None else target):
+            return []
+        with migration_timeouts(engine):
+            return self._apply(engine, target, echo)
+
+    def _apply(self, engine, target, echo):
+        version_metadata.create_all(engine)
+        applied = []
+        for version, name, fn in self.pending(engine, target):
+            echo(f"Applying migration {version}: {name}")
+            started = time.perf_counter()
+            fn(MigrationContext(engine, echo))
+            with engine.begin() as conn:
+                # another worker may have finished the same step meanwhile
+                done = conn.execute(
+                    select(schema_version.c.version).where(schema_version.c.version == version)
+                ).scalar()
+                if not done:
+                    conn.execute(schema_version.insert().values(
+                        version=version, name=name, applied_at=datetime.utcnow()
+                    ))
+            echo(f"  done in {time.perf_counter() - started:.2f}s")
+            applied.append(version)
+        return applied
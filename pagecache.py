@@ -0,0 +1,124 @@
+"""In-process caches for pages and counts that every visitor sees the same way.
+
+Each worker keeps its own copy, invalidated through data versions: named
+counters in the data_version table that writers bump in the same
+transaction as the change. A worker re-reads all counters in one query at
+most every max_age seconds, so a change reaches every worker (on every
+host) within that bound, and between checks a cached page costs no
+database work at all. The worker that made the change sees it at once.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime
+
+class Versions:
+    """Process-local view of the shared version counters."""
+
+    def __init__(self, load, max_age):
+        self.load = load  # () -> {name: (version, changed_at)}
+        self.max_age = max_age
+        self._values = {}
+        self._checked = float('-inf')
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """(version, changed_at) for name; (0, None) until it is first bumped."""
+        if time.monotonic() - self._checked >= self.max_age:
+            with self._lock:
+                # another thread may have reloaded while this one waited
+                if time.monotonic() - self._checked >= self.max_age:
+                    self._values = self.load()
+                    self._checked = time.monotonic()
+        return self._values.get(name, (0, None))
+
+    def expire(self):
+        self._checked = float('-inf')
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+        self.expire()
+
+class CachedPage:
+    __slots__ = ('body', 'version', 'etag', 'last_modified')
+
+    def __init__(self, body, version, last_modified):
+        self.body = body
+        self.version = version
+        # the body hash changes the ETag on deploys that edit the template, too
+        self.etag = f'{version}-' + hashlib.sha1(body.encode()).hexdigest()[:16]
+        self.last_modified = last_modified
+
+class PageCache:
+    def __init__(self):
+        self._pages = {}
+
+    def get(self, key, version):
+        page = self._pages.get(key)
+        return page if page is not None and page.version == version else None
+
+    def put(self, key, version, body, changed_at=None):
+        page = CachedPage(body, version, (changed_at or datetime.utcnow()).replace(microsecond=0))
+        self._pages[key] = page
+        return page
+
+    def clear(self):
+        self._pages.clear()
+
+class Availability:
+    """Tickets left per tier, per event, at most max_age seconds old.
+
+    An event's entry is reloaded (one query) when it is older than max_age
+    or was loaded under another catalogue version. Sales committed by this
+    worker are applied to it at once; other workers' sales show up when the
+    entry next reloads.
+    """
+
+    def __init__(self, load, max_age):
+        self.load = load  # event_id -> [{'id', 'name', 'price', 'remaining'}, ...], None if no event
+        self.max_age = max_age
+        self._events = {}
+
+    def get(self, event_id, version):
+        entry = self._events.get(event_id)
+        if entry is None or entry[0] != version or time.monotonic() - entry[1] >= self.max_age:
+            entry = (version, time.monotonic(), self.load(event_id))
+            self._events[event_id] = entry
+        return entry[2]
+
+    def sold(self, event_id, tier_id, quantity):
+        entry = self._events.get(event_id)
+        if not entry or entry[2] is None:
+            return
+        # copy on write: other threads may be rendering the current list
+        tiers = [dict(t, remaining=max(t['remaining'] - quantity, 0)) if t['id'] == tier_id else t
+                 for t in entry[2]]
+        self._events[event_id] = (entry[0], entry[1], tiers)
+
+    def clear(self):
+        self._events.clear()
+
+class SoldOut:
+    """Ids of the tiers with no tickets left.
+
+    Reloaded (one query) when its version moves, which the sale of a tier's
+    last ticket does on every worker, and at least every max_age seconds, so
+    a tier whose stock comes back reopens without anyone clearing a flag.
+    """
+
+    def __init__(self, load, max_age):
+        self.load = load  # () -> iterable of tier ids
+        self.max_age = max_age
+        self._state = (None, float('-inf'), frozenset())
+
+    def get(self, version):
+        loaded_version, loaded_at, tiers = self._state
+        if loaded_version != version or time.monotonic() - loaded_at >= self.max_age:
+            tiers = frozenset(self.load())
+            self._state = (version, time.monotonic(), tiers)
+        return tiers
+
+    def mark(self, tier_id):
+        """Flag a tier this worker found sold out before its version says so."""
+        loaded_version, loaded_at, tiers = self._state
+        self._state = (loaded_version, loaded_at, tiers | {tier_id})
@@ -0,0 +1,126 @@
+"""Responsive poster renditions, built with Pillow.
+
+render_poster(source, static_folder, key) writes the poster at several
+widths as AVIF (when Pillow was built with it), WebP and JPEG under
+static/posters/, named <key>-<width>w.<hash>.<ext> after the source image's
+content hash, plus <key>.json describing them for templates/_poster.html.
+Rendering is skipped when <key>.json already names the same hash, so it is
+cheap to call on every build or upload. A given name always holds the same
+bytes, so the files are served with immutable caching. Replacing a poster
+keeps the previous image's renditions, for pages rendered moments before.
+"""
+import hashlib
+import io
+import json
+import os
+
+POSTER_DIR = 'posters'
+WIDTHS = (360, 540, 720, 960, 1440)
+# (format, MIME type, Pillow encoder, save options), best compression first;
+# the last one is the <img> fallback every browser can show
+FORMATS = (
+    ('avif', 'image/avif', 'AVIF', {'quality': 55}),
+    ('webp', 'image/webp', 'WEBP', {'quality': 78, 'method': 6}),
+    ('jpg', 'image/jpeg', 'JPEG', {'quality': 80, 'progressive': True, 'optimize': True}),
+)
+
+def available_formats():
+    from PIL import features  # Pillow loads only when rendering, not at app start
+
+    return [f for f in FORMATS if f[0] != 'avif' or features.check('avif')]
+
+def rendition_widths(width):
+    """The WIDTHS narrower than the source, plus the source width: never upscale."""
+    return [w for w in WIDTHS if w < width] + [width]
+
+def load_poster(static_folder, key):
+    try:
+        with open(os.path.join(static_folder, POSTER_DIR, f'{key}.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _save(image, path, encoder, options):
+    buf = io.BytesIO()
+    image.save(buf, encoder, **options)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(buf.getvalue())
+    os.replace(tmp, path)
+    return buf.tell()
+
+def _save_json(path, value):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(value, f, indent=2)
+    os.replace(tmp, path)
+
+def render_poster(source, static_folder, key, echo=None):
+    """Render source (a path or binary file) for key; returns the poster description.
+
+    Raises ValueError when source is not an image Pillow can read.
+    """
+    from PIL import Image, ImageOps
+
+    if hasattr(source, 'read'):
+        data = source.read()
+    else:
+        with open(source, 'rb') as f:
+            data = f.read()
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    poster = load_poster(static_folder, key)
+    if poster and poster['hash'] == digest:
+        return poster
+
+    previous = poster['hash'] if poster else None
+
+    out_dir = os.path.join(static_folder, POSTER_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    try:
+        with Image.open(io.BytesIO(data)) as opened:
+            image = ImageOps.exif_transpose(opened).convert('RGB')
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Not a readable image ({e}).")
+    width, height = image.size
+    sources = []
+    for w in rendition_widths(width):
+        scaled = image if w == width else image.resize(
+            (w, round(height * w / width)), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for fmt, mime, encoder, options in available_formats():
+            name = f'{key}-{w}w.{digest}.{fmt}'
+            size = _save(scaled, os.path.join(out_dir, name), encoder, options)
+            entry = next((s for s in sources if s['type'] == mime), None)
+            if entry is None:
+                entry = {'type': mime, 'files': []}
+                sources.append(entry)
+            entry['files'].append([w, f'{POSTER_DIR}/{name}'])
+            if echo:
+                echo(f"  {name} ({size} bytes)")
+
+    poster = {
+        'key': key,
+        'hash': digest,
+        'width': width,
+        'height': height,
+        'sources': sources,
+    }
+    _save_json(os.path.join(out_dir, f'{key}.json'), poster)
+    _remove(out_dir, key, keep=(digest, previous))
+    return poster
+
+def _remove(out_dir, key, keep=()):
+    """Delete key's renditions, except those of the image hashes in keep."""
+    for name in os.listdir(out_dir):
+        # <key>-<width>w.<hash>.<ext>
+        if name.startswith(f'{key}-') and name.rsplit('.', 2)[-2] not in keep:
+            os.remove(os.path.join(out_dir, name))
+
+def remove_poster(static_folder, key):
+    out_dir = os.path.join(static_folder, POSTER_DIR)
+    if not os.path.isdir(out_dir):
+        return
+    _remove(out_dir, key)
+    try:
+        os.remove(os.path.join(out_dir, f'{key}.json'))
+    except FileNotFoundError:
+        pass
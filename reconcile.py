@@ -0,0 +1,227 @@
+"""M-Pesa statement reconciliation.
+
+Stream-parses a Paybill statement export (CSV or XLSX) and hash-joins its
+receipts against pending orders on M-Pesa code and amount. Nothing here
+touches the database; app.py loads the pending orders and applies results.
+"""
+import csv
+import io
+import zipfile
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+from xml.etree.ElementTree import ParseError, iterparse
+
+# header aliases seen in M-Pesa org portal exports and C2B reports (lower-cased)
+CODE_COLUMNS = ('receipt no.', 'receipt no', 'receipt', 'transaction id', 'transid', 'mpesa code')
+AMOUNT_COLUMNS = ('paid in', 'amount', 'transamount', 'credit')
+STATUS_COLUMNS = ('transaction status', 'status')
+PARTY_COLUMNS = ('other party info', 'other party', 'msisdn')
+TIME_COLUMNS = ('completion time', 'transaction time', 'transtime', 'date')
+
+# exports start with a few lines of account details before the header row
+HEADER_SEARCH_ROWS = 50
+
+XLSX_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+StatementLine = namedtuple('StatementLine', 'line code amount party completed_at')
+
+# ================== READERS ==================
+
+def iter_csv_rows(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+def _xlsx_col(ref):
+    n = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        n = n * 26 + ord(ch.upper()) - 64
+    return n - 1
+
+def _xlsx_sheet_name(names):
+    if 'xl/worksheets/sheet1.xml' in names:
+        return 'xl/worksheets/sheet1.xml'
+    sheets = sorted(n for n in names if n.startswith('xl/worksheets/') and n.endswith('.xml'))
+    if not sheets:
+        raise ValueError("No worksheet found in the XLSX file.")
+    return sheets[0]
+
+def iter_xlsx_rows(stream):
+    """Yield rows of the first worksheet without building the sheet in memory."""
+    try:
+        zf = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise ValueError("File is not a valid XLSX workbook.")
+    try:
+        with zf:
+            names = set(zf.namelist())
+            shared = []
+            if 'xl/sharedStrings.xml' in names:
+                with zf.open('xl/sharedStrings.xml') as f:
+                    for _, el in iterparse(f):
+                        if el.tag == XLSX_NS + 'si':
+                            shared.append(''.join(t.text or '' for t in el.iter(XLSX_NS + 't')))
+                            el.clear()
+
+            with zf.open(_xlsx_sheet_name(names)) as f:
+                parent = None
+                for event, el in iterparse(f, events=('start', 'end')):
+                    if event == 'start':
+                        if el.tag == XLSX_NS + 'sheetData':
+                            parent = el
+                        continue
+                    if el.tag != XLSX_NS + 'row':
+                        continue
+                    row = []
+                    for c in el.iter(XLSX_NS + 'c'):
+                        idx = _xlsx_col(c.get('r')) if c.get('r') else len(row)
+                        kind = c.get('t')
+                        if kind == 'inlineStr':
+                            value = ''.join(t.text or '' for t in c.iter(XLSX_NS + 't'))
+                        else:
+                            v = c.find(XLSX_NS + 'v')
+                            value = (v.text or '') if v is not None else ''
+                            if kind == 's' and value:
+                                value = shared[int(value)]
+                        row.extend([''] * (idx - len(row)))
+                        row.append(value)
+                    el.clear()
+                    if parent is not None:
+                        parent.remove(el)
+                    yield row
+    except ParseError as e:
+        raise ValueError(f"The XLSX workbook is damaged: {e}.")
+
+def iter_statement_rows(filename, stream):
+    name = (filename or '').lower()
+    if name.endswith('.xlsx'):
+        return iter_xlsx_rows(stream)
+    if name.endswith('.csv') or name.endswith('.txt'):
+        return iter_csv_rows(stream)
+    raise ValueError("Upload the statement as a .csv or .xlsx file.")
+
+# ================== PARSING ==================
+
+def parse_amount(value):
+    value = (value or '').replace(',', '').replace('KES', '').replace('Ksh', '').strip()
+    if not value:
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        return None
+
+def _find_column(header, aliases):
+    for alias in aliases:
+        if alias in header:
+            return header.index(alias)
+    return None
+
+def _cell(row, idx):
+    if idx is None or idx >= len(row):
+        return ''
+    return row[idx] or ''
+
+def iter_statement_lines(rows):
+    """Find the header row, then yield one StatementLine per completed receipt."""
+    rows = iter(rows)
+    columns = None
+    line_no = 0
+    for line_no, row in enumerate(rows, 1):
+        header = [(c or '').strip().lower() for c in row]
+        code_i = _find_column(header, CODE_COLUMNS)
+        amount_i = _find_column(header, AMOUNT_COLUMNS)
+        if code_i is not None and amount_i is not None:
+            columns = (
+                code_i,
+                amount_i,
+                _find_column(header, STATUS_COLUMNS),
+                _find_column(header, PARTY_COLUMNS),
+                _find_column(header, TIME_COLUMNS),
+            )
+            break
+        if line_no >= HEADER_SEARCH_ROWS:
+            break
+    if columns is None:
+        raise ValueError("Could not find a statement header with receipt and amount columns.")
+
+    code_i, amount_i, status_i, party_i, time_i = columns
+    for line_no, row in enumerate(rows, line_no + 1):
+        code = _cell(row, code_i).strip().upper()
+        if not code:
+            continue
+        if status_i is not None and _cell(row, status_i).strip().lower() not in ('', 'completed'):
+            continue
+        amount = parse_amount(_cell(row, amount_i))
+        if amount is None or amount <= 0:
+            continue  # withdrawals, charges and reversals
+        yield StatementLine(
+            line_no,
+            code,
+            amount,
+            _cell(row, party_i).strip(),
+            _cell(row, time_i).strip(),
+        )
+
+# ================== MATCHING ==================
+
+def reconcile(lines, pending, paid=None):
+    """Hash-join statement lines against pending orders.
+
+    ``pending`` maps an M-Pesa code to the list of ``(order_id, amount)``
+    pending orders that submitted it; ``paid`` maps codes already on a paid
+    order to that order's id. Each line lands in exactly one bucket:
+    matches (code and amount agree), mismatches (amount differs), duplicates
+    (code repeated in the statement, claimed by several orders, or already
+    used to pay another order) or unmatched (no pending order has the code).
+    """
+    paid = paid or {}
+    result = {
+        'lines': 0,
+        'matches': [],
+        'mismatches': [],
+        'duplicates': [],
+        'unmatched': [],
+    }
+    seen = set()
+    for line in lines:
+        result['lines'] += 1
+        entry = {
+            'line': line.line,
+            'code': line.code,
+            'paid': line.amount,
+            'party': line.party,
+            'completed_at': line.completed_at,
+        }
+        if line.code in seen:
+            entry['reason'] = "Code appears more than once in the statement."
+            result['duplicates'].append(entry)
+            continue
+        seen.add(line.code)
+
+        orders = pending.get(line.code)
+        if not orders:
+            result['unmatched'].append(entry)
+            continue
+        if line.code in paid:
+            entry['reason'] = f"Code already paid for order #{paid[line.code]}."
+            result['duplicates'].append(entry)
+            continue
+        if len(orders) > 1:
+            ids = ', '.join(f'#{order_id}' for order_id, _ in orders)
+            entry['reason'] = f"Code was submitted on orders {ids}."
+            result['duplicates'].append(entry)
+            continue
+
+        order_id, amount = orders[0]
+        entry['order_id'] = order_id
+        entry['amount'] = amount
+        if line.amount == amount:
+            result['matches'].append(entry)
+        else:
+            result['mismatches'].append(entry)
+    return result
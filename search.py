@@ -0,0 +1,191 @@
+"""Support-desk search over orders and their tickets (SQLite FTS5).
+
+One FTS5 row per order, keyed by order.id, holding the buyer's name, email,
+phone, M-Pesa code and the order's ticket codes. Triggers on "order" and
+ticket keep it in step with every write, so callers never update it by hand.
+
+The trigram tokenizer (SQLite 3.34+) lets "0712" or "QBC1" match anywhere in
+a field; older SQLite falls back to unicode61 with prefix matching. Other
+backends (PostgreSQL) get an unindexed LIKE scan with the same semantics.
+"""
+import re
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+SEARCH_TABLE = 'order_search'
+SEARCH_COLUMNS = ('buyer_name', 'buyer_email', 'buyer_phone', 'mpesa_code', 'ticket_codes')
+# bm25 weights, same order as SEARCH_COLUMNS: codes are the most specific hits
+SEARCH_WEIGHTS = (2.0, 1.0, 2.0, 5.0, 5.0)
+TRIGRAM_MIN_LENGTH = 3
+# a query made only of digits, spaces, '+' and '-' is one phone number
+PHONE_QUERY = re.compile(r'[\d\s+\-]+')
+PHONE_DIGITS = 9
+
+TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS order_search_ai AFTER INSERT ON "order" BEGIN
+      INSERT INTO order_search(rowid, buyer_name, buyer_email, buyer_phone, mpesa_code, ticket_codes)
+      VALUES (new.id, new.buyer_name, new.buyer_email, new.buyer_phone, coalesce(new.mpesa_code, ''), '');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS order_search_au
+    AFTER UPDATE OF buyer_name, buyer_email, buyer_phone, mpesa_code ON "order" BEGIN
+      UPDATE order_search
+      SET buyer_name = new.buyer_name,
+          buyer_email = new.buyer_email,
+          buyer_phone = new.buyer_phone,
+          mpesa_code = coalesce(new.mpesa_code, '')
+      WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS order_search_ad AFTER DELETE ON "order" BEGIN
+      DELETE FROM order_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS order_search_ticket_ai AFTER INSERT ON ticket BEGIN
+      UPDATE order_search SET ticket_codes = trim(ticket_codes || ' ' || new.code)
+      WHERE rowid = new.order_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS order_search_ticket_ad AFTER DELETE ON ticket BEGIN
+      UPDATE order_search
+      SET ticket_codes = (SELECT coalesce(group_concat(code, ' '), '') FROM ticket
+                          WHERE order_id = old.order_id)
+      WHERE rowid = old.order_id;
+    END
+    """,
+)
+
+TRIGGER_NAMES = ('order_search_ai', 'order_search_au', 'order_search_ad',
+                 'order_search_ticket_ai', 'order_search_ticket_ad')
+
+BACKFILL = """
+    INSERT INTO order_search(rowid, buyer_name, buyer_email, buyer_phone, mpesa_code, ticket_codes)
+    SELECT o.id, o.buyer_name, o.buyer_email, o.buyer_phone, coalesce(o.mpesa_code, ''),
+           (SELECT coalesce(group_concat(t.code, ' '), '') FROM ticket t WHERE t.order_id = o.id)
+    FROM "order" o
+"""
+
+# ================== INDEX ==================
+
+def search_supported(conn):
+    return conn.dialect.name == 'sqlite'
+
+def uses_trigram(conn):
+    sql = conn.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': SEARCH_TABLE}
+    ).scalar()
+    return bool(sql) and 'trigram' in sql
+
+def setup_search_index(conn):
+    """Create the FTS table and triggers if missing; backfill on first creation."""
+    if not search_supported(conn):
+        return False
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': SEARCH_TABLE}
+    ).scalar()
+    if not exists:
+        columns = ', '.join(SEARCH_COLUMNS)
+        try:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5({columns}, tokenize='trigram')"
+            ))
+        except OperationalError:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5({columns}, prefix='2 3 4')"
+            ))
+    for ddl in TRIGGERS:
+        conn.execute(text(ddl))
+    if not exists:
+        conn.execute(text(BACKFILL))
+    return True
+
+def drop_search_triggers(conn):
+    """Stop per-row index upkeep for a bulk load; setup_search_index() puts it back."""
+    if not search_supported(conn):
+        return
+    for name in TRIGGER_NAMES:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+
+def rebuild_search_index(conn):
+    conn.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    conn.execute(text(BACKFILL))
+
+# ================== QUERY ==================
+
+def query_tokens(q):
+    """Split free text into search tokens, shared by the FTS and LIKE paths.
+
+    0712345678, 254712345678 and +254 712 345 678 all end in the same 9
+    digits, so a phone-shaped query becomes that one token, as does any
+    longer run of digits typed as a single word.
+    """
+    if PHONE_QUERY.fullmatch(q.strip()):
+        digits = re.sub(r'\D', '', q)
+        if len(digits) >= PHONE_DIGITS:
+            return [digits[-PHONE_DIGITS:]]
+    tokens = []
+    for token in q.split():
+        token = token.replace('"', '').strip('+')
+        if token.isdigit() and len(token) > PHONE_DIGITS:
+            token = token[-PHONE_DIGITS:]
+        if token:
+            tokens.append(token)
+    return tokens
+
+def build_match_query(q, trigram=True):
+    """Turn free text into an FTS5 MATCH expression (every term must match)."""
+    terms = []
+    for token in query_tokens(q):
+        if trigram:
+            if len(token) < TRIGRAM_MIN_LENGTH:
+                continue
+            terms.append(f'"{token}"')
+        else:
+            terms.append(f'"{token}"*')
+    return ' '.join(terms)
+
+def search_terms(q):
+    return [token.lower() for token in query_tokens(q) if len(token) >= TRIGRAM_MIN_LENGTH]
+
+def search_order_ids_like(conn, q, limit=50):
+    """Portable fallback: every term must appear in some field; newest first."""
+    terms = search_terms(q)
+    if not terms:
+        return []
+    clauses, params = [], {'limit': limit}
+    for i, term in enumerate(terms):
+        params[f't{i}'] = '%' + term.replace('%', '').replace('_', '') + '%'
+        fields = ' OR '.join(f'lower(coalesce(o.{c}, \'\')) LIKE :t{i}' for c in SEARCH_COLUMNS[:4])
+        clauses.append(
+            f'({fields} OR EXISTS (SELECT 1 FROM ticket t '
+            f'WHERE t.order_id = o.id AND lower(t.code) LIKE :t{i}))'
+        )
+    rows = conn.execute(
+        text(f'SELECT o.id FROM "order" o WHERE {" AND ".join(clauses)} '
+             f'ORDER BY o.created_at DESC, o.id DESC LIMIT :limit'),
+        params
+    )
+    return [row[0] for row in rows]
+
+def search_order_ids(conn, q, limit=50):
+    """Return order ids best match first, ranked by bm25."""
+    if not search_supported(conn):
+        return search_order_ids_like(conn, q, limit)
+    match = build_match_query(q, trigram=uses_trigram(conn))
+    if not match:
+        return []
+    weights = ', '.join(str(w) for w in SEARCH_WEIGHTS)
+    rows = conn.execute(
+        text(f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match "
+             f"ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT :limit"),
+        {'match': match, 'limit': limit}
+    )
+    return [row[0] for row in rows]
@@ -0,0 +1,197 @@
+"""Synthetic dataset generator for load and scale testing.
+
+Bulk-inserts events, tiers, orders with mixed payment statuses, tickets
+with a used/valid mix and M-Pesa codes. Rows go straight through a Core
+connection as batched executemany, one transaction per batch: no ORM
+session, so nothing autoflushes or piles up in an identity map.
+
+The same seed on the same starting database always produces the same
+rows. Ids continue after the current maximum, and codes are derived from
+those ids, so a second run adds to the data instead of colliding with it.
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, bindparam, column, select, table, text
+
+TIERS = (('Early Bird', 800), ('Regular', 1000), ('VIP', 1500), ('VVIP', 3000))
+STATUS_WEIGHTS = (('paid', 60), ('pending', 30), ('failed', 10))
+# share of pending/failed orders that submitted an M-Pesa code anyway
+CODE_SUBMITTED = {'paid': 1.0, 'pending': 0.8, 'failed': 0.5}
+FIRST_NAMES = ('Amina', 'Brian', 'Cynthia', 'David', 'Esther', 'Faith', 'George', 'Halima',
+               'Ian', 'Joy', 'Kevin', 'Lilian', 'Mercy', 'Njeri', 'Otieno', 'Purity',
+               'Rashid', 'Sharon', 'Tom', 'Wanjiku')
+LAST_NAMES = ('Achieng', 'Barasa', 'Chege', 'Kamau', 'Kariuki', 'Kiprop', 'Mwangi', 'Njoroge',
+              'Ochieng', 'Odhiambo', 'Omondi', 'Otieno', 'Wafula', 'Wambui', 'Wanjala')
+PHONE_PREFIXES = ('25470', '25471', '25472', '25474', '25479', '25411')
+BASE36 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# lightweight table clauses: typed where SQLAlchemy must convert (DateTime on SQLite)
+event_table = table(
+    'event', column('id'), column('name'), column('description'), column('location'),
+    column('start_time', DateTime), column('end_time', DateTime),
+)
+tier_table = table(
+    'ticket_type', column('id'), column('event_id'), column('name'), column('price'),
+    column('total_quantity'), column('sold_quantity'),
+)
+order_table = table(
+    'order', column('id'), column('buyer_name'), column('buyer_email'), column('buyer_phone'),
+    column('payment_method'), column('payment_status'), column('mpesa_code'), column('amount'),
+    column('created_at', DateTime), column('ticket_type_id'), column('quantity'),
+)
+ticket_table = table(
+    'ticket', column('id'), column('order_id'), column('ticket_type_id'), column('code'),
+    column('status'), column('created_at', DateTime), column('used_at', DateTime),
+)
+
+# ================== CODES ==================
+
+def ticket_code(n):
+    # multiplying by an odd constant permutes 40-bit integers: unique and random-looking,
+    # and 10 hex digits never clash with the 8 of generate_ticket_code()
+    return f'{(n * 0x9E3779B97F) & 0xFFFFFFFFFF:010X}'
+
+def mpesa_code(n):
+    # same trick mod 36**9 (the multiplier is coprime to 36), in receipt-like base 36
+    v = (n * 0x5DEECE66D) % 36 ** 9
+    digits = []
+    for _ in range(9):
+        v, r = divmod(v, 36)
+        digits.append(BASE36[r])
+    return 'S' + ''.join(reversed(digits))
+
+# ================== GENERATOR ==================
+
+def _max_id(conn, table):
+    return conn.execute(text(f'SELECT coalesce(max(id), 0) FROM "{table}"')).scalar()
+
+def _fix_sequences(conn, tables):
+    # explicit ids leave PostgreSQL's serial sequences behind
+    if conn.dialect.name != 'postgresql':
+        return
+    for table in tables:
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+            f"(SELECT coalesce(max(id), 1) FROM \"{table}\"))"
+        ))
+
+def generate(conn, orders, events=1, tiers=3, seed=1, batch_size=10_000,
+             used_ratio=0.3, headroom=1000, start=datetime(2025, 10, 1), echo=None):
+    """Insert the dataset; returns counts and the id range of the new orders.
+
+    ``conn`` is a Connection outside any transaction; each batch commits.
+    Every tier ends with sold_quantity matching its tickets and
+    total_quantity = sold_quantity + headroom.
+    """
+    rng = random.Random(seed)
+    statuses = [s for s, _ in STATUS_WEIGHTS]
+    weights = [w for _, w in STATUS_WEIGHTS]
+    event_base, tier_base = _max_id(conn, 'event'), _max_id(conn, 'ticket_type')
+    order_base, ticket_base = _max_id(conn, 'order'), _max_id(conn, 'ticket')
+
+    event_rows, tier_rows = [], []
+    for e in range(events):
+        event_id = event_base + e + 1
+        starts = start + timedelta(days=60 + 14 * e, hours=15)
+        event_rows.append({
+            'id': event_id,
+            'name': f'Synthetic Event {event_id}',
+            'description': f'Generated by seed-synthetic (seed {seed})',
+            'location': 'Greenyard Resort, Mtwapa',
+            'start_time': starts,
+            'end_time': starts + timedelta(hours=14),
+        })
+        for name, price in TIERS[:tiers]:
+            tier_rows.append({'id': tier_base + len(tier_rows) + 1, 'event_id': event_id,
+                              'name': name, 'price': price,
+                              'total_quantity': 0, 'sold_quantity': 0})
+    conn.execute(event_table.insert(), event_rows)
+    conn.execute(tier_table.insert(), tier_rows)
+    conn.commit()
+
+    # orders spread evenly over the 60 days before the first event
+    spacing = 60 * 86400 / max(orders, 1)
+    sold = {t['id']: 0 for t in tier_rows}
+    ticket_id = ticket_base
+    n_tickets = 0
+    for batch_start in range(0, orders, batch_size):
+        order_rows, ticket_rows = [], []
+        for i in range(batch_start, min(batch_start + batch_size, orders)):
+            order_id = order_base + i + 1
+            tier = rng.choice(tier_rows)
+            quantity = rng.choices((1, 2, 3, 4, 6), (50, 25, 12, 8, 5))[0]
+            status = rng.choices(statuses, weights)[0]
+            created_at = start + timedelta(seconds=int(i * spacing + rng.random() * spacing))
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            order_rows.append({
+                'id': order_id,
+                'buyer_name': f'{first} {last}',
+                'buyer_email': f'{first}.{last}.{order_id}@example.com'.lower(),
+                'buyer_phone': rng.choice(PHONE_PREFIXES) + f'{rng.randrange(10**7):07d}',
+                'payment_method': 'mpesa_manual',
+                'payment_status': status,
+                'mpesa_code': mpesa_code(order_id) if rng.random() < CODE_SUBMITTED[status] else None,
+                'amount': tier['price'] * quantity,
+                'created_at': created_at,
+                'ticket_type_id': tier['id'],
+                'quantity': quantity,
+            })
+            if status != 'paid':
+                continue
+            sold[tier['id']] += quantity
+            for _ in range(quantity):
+                ticket_id += 1
+                used = rng.random() < used_ratio
+                ticket_rows.append({
+                    'id': ticket_id,
+                    'order_id': order_id,
+                    'ticket_type_id': tier['id'],
+                    'code': ticket_code(ticket_id),
+                    'status': 'used' if used else 'valid',
+                    'created_at': created_at,
+                    'used_at': created_at + timedelta(days=60) if used else None,
+                })
+        conn.execute(order_table.insert(), order_rows)
+        if ticket_rows:
+            conn.execute(ticket_table.insert(), ticket_rows)
+        conn.commit()
+        n_tickets += len(ticket_rows)
+        if echo:
+            echo(f"  {batch_start + len(order_rows)}/{orders} orders, {n_tickets} tickets")
+
+    conn.execute(
+        tier_table.update()
+        .where(tier_table.c.id == bindparam('tier_id'))
+        .values(sold_quantity=bindparam('sold'), total_quantity=bindparam('total')),
+        [{'tier_id': tier_id, 'sold': n, 'total': n + headroom} for tier_id, n in sold.items()]
+    )
+    _fix_sequences(conn, ('event', 'ticket_type', 'order', 'ticket'))
+    conn.commit()
+    return {
+        'events': len(event_rows),
+        'ticket_types': len(tier_rows),
+        'orders': orders,
+        'tickets': n_tickets,
+        'event_ids': [e['id'] for e in event_rows],
+        'order_ids': (order_base + 1, order_base + orders),
+    }
+
+# ================== STATEMENT ==================
+
+STATEMENT_HEADER = ('Receipt No.', 'Completion Time', 'Details', 'Transaction Status',
+                    'Paid In', 'Withdrawn', 'Balance', 'Other Party Info')
+
+def statement_rows(conn, first_order_id, last_order_id):
+    """Paybill statement lines for the new orders' M-Pesa codes, for `flask reconcile-statement`."""
+    o = order_table.c
+    rows = conn.execution_options(yield_per=10_000).execute(
+        select(o.mpesa_code, o.created_at, o.amount, o.buyer_phone, o.buyer_name)
+        .where(o.id.between(first_order_id, last_order_id),
+               o.mpesa_code.isnot(None),
+               o.payment_status != 'failed')  # a failed order never paid
+        .order_by(o.id)
+    )
+    for code, created_at, amount, phone, name in rows:
+        yield (code, (created_at + timedelta(minutes=2)).strftime('%d-%m-%Y %H:%M:%S'),
+               'Pay Bill Online', 'Completed', f'{amount:,}.00', '', '', f'{phone} - {name}')
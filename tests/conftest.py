@@ -0,0 +1,100 @@
+"""Shared fixtures: the app on a scratch database, seeded once per session.
+
+app.py reads its settings from the environment at import, so they are set
+here before the first import. Tests run on a temporary SQLite file, or on
+PostgreSQL when TEST_DATABASE_URL points at one that answers (its tables are
+dropped first, so give it a scratch database); tests marked ``postgres`` skip
+without it. QUERY_BUDGET_STRICT is on, so a view over its @query_budget fails
+the test.
+"""
+import os
+import tempfile
+
+import pytest
+
+WORKDIR = tempfile.mkdtemp(prefix='tickets-tests-')
+ORDER_SIZES = (1, 5, 25)
+
+
+def postgres_url():
+    """TEST_DATABASE_URL if a PostgreSQL server answers there, else None."""
+    url = os.environ.get('TEST_DATABASE_URL')
+    if not url:
+        return None
+    try:
+        import psycopg2
+
+        psycopg2.connect(url.replace('postgresql+psycopg2://', 'postgresql://'),
+                         connect_timeout=3).close()
+    except Exception:
+        return None
+    return url
+
+
+POSTGRES_URL = postgres_url()
+os.environ['DATABASE_URL'] = POSTGRES_URL or 'sqlite:///' + os.path.join(WORKDIR, 'tickets.db')
+os.environ['QUERY_BUDGET_STRICT'] = 'on'
+os.environ['QUERY_LOG_LEVEL'] = 'WARNING'
+os.environ['TRACE_FILE'] = os.path.join(WORKDIR, 'traces.jsonl')
+os.environ['MAIL_DEFAULT_SENDER'] = 'tests@example.com'
+os.environ['SECRET_KEY'] = 'tests'
+os.environ['ADMIN_PASSWORD'] = 'tests'
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'postgres: needs TEST_DATABASE_URL to reach PostgreSQL')
+
+
+def pytest_collection_modifyitems(config, items):
+    if POSTGRES_URL:
+        return
+    skip = pytest.mark.skip(reason='TEST_DATABASE_URL is unset or PostgreSQL is unreachable')
+    for item in items:
+        if 'postgres' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope='session')
+def app():
+    import app as tickets
+
+    tickets.app.config['TESTING'] = True
+    tickets.app.extensions['mail'].suppress = True
+    with tickets.app.app_context():
+        if POSTGRES_URL:
+            tickets.db.session.execute(tickets.db.text('DROP SCHEMA public CASCADE'))
+            tickets.db.session.execute(tickets.db.text('CREATE SCHEMA public'))
+            tickets.db.session.commit()
+        tickets.setup_db()
+        tickets.db.session.remove()
+    return tickets.app
+
+
+@pytest.fixture
+def db(app):
+    import app as tickets
+
+    with app.app_context():
+        yield tickets.db
+        tickets.db.session.remove()
+
+
+@pytest.fixture
+def no_qr_files(monkeypatch):
+    """Issue tickets without writing their QR images into static/qrs."""
+    import app as tickets
+
+    monkeypatch.setattr(tickets, 'generate_qr', lambda code: f'/static/qrs/{code}.png')
+
+
+@pytest.fixture(scope='session')
+def seeded_orders(app):
+    """Paid orders holding 1, 5 and 25 tickets: {size: (order_id, ticket codes)}."""
+    from bench.query_counts import seed_orders
+
+    import app as tickets
+
+    with app.app_context():
+        seeded = seed_orders(ORDER_SIZES)
+        tickets.db.session.remove()
+    return seeded
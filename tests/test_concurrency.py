@@ -0,0 +1,93 @@
+"""Concurrent payment paths issue each order's tickets exactly once (PostgreSQL only).
+
+SQLite serialises writers, so only PostgreSQL exercises the row locks:
+FOR UPDATE SKIP LOCKED in apply_reconciled_matches and FOR UPDATE in
+admin_mark_paid.
+"""
+import threading
+
+import pytest
+
+import app as tickets
+
+pytestmark = pytest.mark.postgres
+
+ORDERS = 12
+QUANTITY = 2
+WORKERS = 4
+
+
+def seed_pending_orders():
+    """Pending orders with submitted M-Pesa codes; returns their reconcile matches."""
+    tt = tickets.TicketType.query.filter_by(name='Regular').first()
+    matches = []
+    for i in range(ORDERS):
+        order = tickets.Order(
+            buyer_name='Concurrent Buyer',
+            buyer_email='concurrent@example.com',
+            buyer_phone='254700000001',
+            payment_method='mpesa_manual',
+            payment_status='pending',
+            mpesa_code=f'CONC{i:06d}',
+            amount=tt.price * QUANTITY,
+            ticket_type_id=tt.id,
+            quantity=QUANTITY,
+        )
+        tickets.db.session.add(order)
+        tickets.db.session.flush()
+        matches.append({'order_id': order.id, 'code': order.mpesa_code, 'amount': order.amount})
+    tickets.db.session.commit()
+    return tt.id, matches
+
+
+def run_together(targets):
+    barrier = threading.Barrier(len(targets))
+    errors = []
+
+    def wrap(target):
+        try:
+            with tickets.app.app_context():
+                barrier.wait()
+                target()
+        except Exception as e:  # surfaced by the assertion below
+            errors.append(e)
+
+    threads = [threading.Thread(target=wrap, args=(t,)) for t in targets]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors
+
+
+def test_reconcile_and_mark_paid_issue_once(app, no_qr_files, monkeypatch):
+    monkeypatch.setitem(app.config, 'WTF_CSRF_ENABLED', False)
+    with app.app_context():
+        tier_id, matches = seed_pending_orders()
+        sold_before = tickets.db.session.get(tickets.TicketType, tier_id).sold_quantity or 0
+        tickets.db.session.remove()
+
+    def reconcile():
+        tickets.apply_reconciled_matches(matches, batch_size=3)
+
+    def mark_paid():
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['is_admin'] = True
+        for match in reversed(matches):
+            response = client.post(f"/admin/mark_paid/{match['order_id']}")
+            assert response.status_code == 200
+
+    run_together([reconcile] * (WORKERS - 1) + [mark_paid])
+
+    with app.app_context():
+        ids = [m['order_id'] for m in matches]
+        per_order = dict(
+            tickets.db.session.query(tickets.Ticket.order_id, tickets.db.func.count())
+            .filter(tickets.Ticket.order_id.in_(ids))
+            .group_by(tickets.Ticket.order_id)
+        )
+        assert per_order == {order_id: QUANTITY for order_id in ids}
+        assert {o.payment_status for o in tickets.Order.query.filter(tickets.Order.id.in_(ids))} == {'paid'}
+        sold = tickets.db.session.get(tickets.TicketType, tier_id).sold_quantity
+        assert sold == sold_before + ORDERS * QUANTITY
@@ -0,0 +1,35 @@
+"""Spreadsheet exports: the XLSX parts are well-formed XML, CSV formulas are defused."""
+import io
+import zipfile
+from datetime import datetime
+from xml.etree import ElementTree
+
+import exports
+
+NS = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+
+def sheet_rows(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        for name in zf.namelist():
+            ElementTree.fromstring(zf.read(name))  # every part must parse
+        root = ElementTree.fromstring(zf.read('xl/worksheets/sheet1.xml'))
+    return [[''.join(c.itertext()) for c in row.findall('s:c', NS)]
+            for row in root.iter(f"{{{NS['s']}}}row")]
+
+
+def test_xlsx_strips_xml_illegal_characters():
+    rows = [('Ann\x01 Bee', 'ann@example.com\x0b', 2, datetime(2025, 12, 6, 15, 0)),
+            ('Tab\tand\nnewline', '<b>&</b>', 1.5, None)]
+    data = b''.join(exports.iter_xlsx(('Name', 'Email', 'Qty', 'Created'), rows,
+                                      sheet_name='Orders\x02', chunk_rows=1))
+    assert sheet_rows(data) == [
+        ['Name', 'Email', 'Qty', 'Created'],
+        ['Ann Bee', 'ann@example.com', '2', '2025-12-06 15:00:00'],
+        ['Tab\tand\nnewline', '<b>&</b>', '1.5', ''],
+    ]
+
+
+def test_csv_defuses_formulas():
+    data = b''.join(exports.iter_csv(('Name', 'Qty'), [('=HYPERLINK("x")', -1)]))
+    assert data.decode('utf-8-sig').splitlines() == ['Name,Qty', '"\'=HYPERLINK(""x"")",-1']
@@ -0,0 +1,21 @@
+"""QUERY_BUDGET_STRICT turns a view going over its @query_budget into an error."""
+import pytest
+
+import app as tickets
+
+
+def test_strict_mode_is_on(app):
+    assert tickets.QUERY_BUDGET_STRICT
+
+
+def test_view_within_budget_passes(app, seeded_orders):
+    order_id, codes = seeded_orders[25]
+    response = app.test_client().get(f'/ticket/{codes[0]}')
+    assert response.status_code == 200
+
+
+def test_view_over_budget_raises(app, seeded_orders, monkeypatch):
+    order_id, codes = seeded_orders[25]
+    monkeypatch.setattr(app.view_functions['ticket_detail'], 'query_budget', 0)
+    with pytest.raises(tickets.QueryBudgetExceeded, match='ticket_detail issued'):
+        app.test_client().get(f'/ticket/{codes[0]}')
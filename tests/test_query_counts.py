@@ -0,0 +1,50 @@
+"""Pages and the ticket email issue the same statements whatever the order size."""
+import pytest
+
+from bench.query_counts import count_statements
+
+import app as tickets
+
+
+def counts_per_size(app, seeded_orders, run):
+    counts = {}
+    with app.app_context():
+        engines = list(tickets.db.engines.values())
+        for size, (order_id, codes) in seeded_orders.items():
+            with count_statements(engines) as statements:
+                run(order_id, codes)
+            counts[size] = len(statements)
+            tickets.db.session.remove()
+    return counts
+
+
+@pytest.mark.parametrize('endpoint, request_for', [
+    ('order_detail', lambda client, order_id, codes: client.get(f'/order/{order_id}')),
+    ('ticket_detail', lambda client, order_id, codes: client.get(f'/ticket/{codes[-1]}')),
+    ('validate_ticket', lambda client, order_id, codes: client.post('/validate', data={'code': codes[0]})),
+])
+def test_view_query_count_is_fixed(app, seeded_orders, endpoint, request_for):
+    client = app.test_client()
+
+    def run(order_id, codes):
+        response = request_for(client, order_id, codes)
+        assert response.status_code == 200
+        response.close()
+
+    counts = counts_per_size(app, seeded_orders, run)
+    assert len(set(counts.values())) == 1, f"{endpoint} grows with tickets: {counts}"
+    assert max(counts.values()) <= app.view_functions[endpoint].query_budget
+
+
+def test_build_ticket_email_query_count_is_fixed(app, seeded_orders):
+    counts = {}
+    with app.app_context():
+        engines = list(tickets.db.engines.values())
+        for size, (order_id, codes) in seeded_orders.items():
+            # callers of send_ticket_email already hold the order
+            order = tickets.db.session.get(tickets.Order, order_id)
+            with count_statements(engines) as statements:
+                tickets.build_ticket_email(order)
+            counts[size] = len(statements)
+            tickets.db.session.remove()
+    assert len(set(counts.values())) == 1, f"build_ticket_email grows with tickets: {counts}"
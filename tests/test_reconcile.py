@@ -0,0 +1,53 @@
+"""Statement reconciliation: damaged uploads fail with a ValueError the page can show."""
+import io
+import logging
+import zipfile
+
+import pytest
+
+import reconcile
+import app as tickets
+
+
+def workbook(sheet_xml):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as zf:
+        zf.writestr('xl/worksheets/sheet1.xml', sheet_xml)
+    buf.seek(0)
+    return buf
+
+
+def test_xlsx_rows_are_read():
+    sheet = ('<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+             '<sheetData><row><c r="A1" t="inlineStr"><is><t>Receipt No.</t></is></c>'
+             '<c r="C1"><v>1000</v></c></row></sheetData></worksheet>')
+    assert list(reconcile.iter_xlsx_rows(workbook(sheet))) == [['Receipt No.', '', '1000']]
+
+
+@pytest.mark.parametrize('stream', [
+    io.BytesIO(b'not a zip'),
+    workbook('<worksheet><sheetData><row>'),
+    workbook('<worksheet><sheetData></row></sheetData></worksheet>'),
+], ids=['not-zip', 'truncated', 'mismatched'])
+def test_damaged_xlsx_raises_value_error(stream):
+    with pytest.raises(ValueError):
+        list(reconcile.iter_xlsx_rows(stream))
+
+
+def test_mark_paid_logs_email_failure(db, no_qr_files, monkeypatch, caplog):
+    tt = tickets.TicketType.query.first()
+    order = tickets.Order(buyer_name='Mail Fails', buyer_email='mailfails@example.com',
+                          buyer_phone='254700000002', payment_method='mpesa_manual',
+                          payment_status='pending', amount=tt.price, ticket_type_id=tt.id,
+                          quantity=1)
+    db.session.add(order)
+    db.session.commit()
+
+    def send_ticket_email(order):
+        raise ConnectionRefusedError('SMTP is down')
+
+    monkeypatch.setattr(tickets, 'send_ticket_email', send_ticket_email)
+    with caplog.at_level(logging.ERROR, logger=tickets.app.logger.name):
+        assert tickets.mark_orders_paid([order]) == [order]
+    assert order.payment_status == 'paid' and len(order.tickets) == 1
+    assert f'Emailing tickets for order {order.id} failed' in caplog.text
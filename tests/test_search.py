@@ -0,0 +1,47 @@
+"""Support-desk search: phone numbers match however they are typed."""
+import pytest
+
+import search
+import app as tickets
+
+PHONE_QUERIES = ['0712345678', '712345678', '254712345678', '+254712345678',
+                 '+254 712345678', '+254 712 345 678', '0712-345-678']
+
+
+@pytest.mark.parametrize('q', PHONE_QUERIES)
+def test_phone_query_is_one_token(q):
+    assert search.query_tokens(q) == ['712345678']
+
+
+def test_words_and_codes_stay_separate():
+    assert search.query_tokens('Ann "QBC123" +254712345678') == ['Ann', 'QBC123', '712345678']
+    assert search.search_terms('Jo QBC123 07') == ['qbc123']
+
+
+@pytest.fixture(scope='module')
+def phone_order(app):
+    with app.app_context():
+        tt = tickets.TicketType.query.first()
+        order = tickets.Order(
+            buyer_name='Phone Search',
+            buyer_email='phonesearch@example.com',
+            buyer_phone='0712345678',
+            payment_method='mpesa_manual',
+            payment_status='pending',
+            mpesa_code='PHS1234567',
+            amount=tt.price,
+            ticket_type_id=tt.id,
+            quantity=1,
+        )
+        tickets.db.session.add(order)
+        tickets.db.session.commit()
+        order_id = order.id
+        tickets.db.session.remove()
+    return order_id
+
+
+@pytest.mark.parametrize('q', PHONE_QUERIES)
+def test_phone_search_finds_order(db, phone_order, q):
+    with db.engine.connect() as conn:
+        assert phone_order in search.search_order_ids(conn, q)
+        assert phone_order in search.search_order_ids_like(conn, q)
@@ -0,0 +1,174 @@
+"""Lightweight tracing spans.
+
+    with tracer.span('generate_qr', code=code) as span:
+        ...
+        span.set('bytes', size)
+
+Spans nest through a ContextVar, so a span opened while a request is being
+served becomes a child of that request's span. The default tracer keeps a
+trace in memory and appends it to a JSON-lines file (one span per line)
+when its root span ends, but only if the root took at least min_ms: slow
+requests are kept whole and fast ones never touch the disk. A trace holds
+at most max_spans spans; the root records how many more it dropped, so a
+request issuing thousands of tickets cannot grow one without bound.
+
+With the "otel" exporter spans go to OpenTelemetry instead. That needs the
+opentelemetry-api package, plus an SDK and exporter configured the usual
+way (e.g. opentelemetry-instrument or OTEL_* environment variables).
+"""
+import json
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_current = ContextVar('current_span', default=None)
+
+MAX_SPANS = 1000
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent', 'root', 'attrs', 'records', 'dropped',
+                 'started_at', 'started')
+
+    def __init__(self, name, parent, attrs):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attrs = attrs
+        # every span of a trace appends to the root's list, or counts on the root once it is full
+        self.root = (parent.root or parent) if parent else None  # None on the root itself
+        self.records = parent.records if parent else []
+        self.dropped = 0
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+
+    def set(self, key, value):
+        self.attrs[key] = value
+
+class _NullSpan:
+    trace_id = None
+
+    def set(self, key, value):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+# ================== TRACERS ==================
+
+class Tracer:
+    """No-op tracer; subclasses record spans. start_span/end_span serve hooks that cannot use `with`."""
+
+    def start_span(self, name, **attrs):
+        return NULL_SPAN
+
+    def after_fork(self):
+        pass
+
+    def end_span(self, span, error=None):
+        pass
+
+    @contextmanager
+    def span(self, name, **attrs):
+        span = self.start_span(name, **attrs)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, e)
+            raise
+        self.end_span(span)
+
+class JsonLinesTracer(Tracer):
+    def __init__(self, path, min_ms=0.0, max_spans=MAX_SPANS):
+        self.path = path
+        self.min_ms = min_ms
+        self.max_spans = max_spans
+        self._lock = threading.Lock()
+
+    def after_fork(self):
+        # another thread may have held the lock when the process forked
+        self._lock = threading.Lock()
+
+    def start_span(self, name, **attrs):
+        span = Span(name, _current.get(), attrs)
+        _current.set(span)
+        return span
+
+    def end_span(self, span, error=None):
+        duration_ms = (time.perf_counter() - span.started) * 1000
+        # restore the parent directly: the request's teardown may run in another context
+        _current.set(span.parent)
+        if span.parent is not None and len(span.records) >= self.max_spans - 1:
+            span.root.dropped += 1  # the last slot is the root's
+            return
+        if span.parent is None and span.dropped:
+            span.attrs['dropped_spans'] = span.dropped
+        span.records.append({
+            'trace_id': span.trace_id,
+            'span_id': span.span_id,
+            'parent_id': span.parent.span_id if span.parent else None,
+            'name': span.name,
+            'start': round(span.started_at, 6),
+            'duration_ms': round(duration_ms, 3),
+            'attrs': span.attrs,
+            'error': type(error).__name__ if error else None,
+        })
+        if span.parent is None and duration_ms >= self.min_ms:
+            self._write(span.records)
+
+    def _write(self, records):
+        data = ''.join(json.dumps(r, default=str) + '\n' for r in records)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(data)
+
+class _OtelSpan:
+    __slots__ = ('span', 'token')
+
+    def __init__(self, span, token):
+        self.span = span
+        self.token = token
+
+    @property
+    def trace_id(self):
+        return format(self.span.get_span_context().trace_id, '032x')
+
+    def set(self, key, value):
+        if value is not None:
+            self.span.set_attribute(key, value)
+
+class OpenTelemetryTracer(Tracer):
+    def __init__(self, service):
+        try:
+            from opentelemetry import context, trace
+        except ImportError:
+            raise RuntimeError("TRACE_EXPORTER=otel needs the opentelemetry-api package.")
+        self._context = context
+        self._trace = trace
+        self._tracer = trace.get_tracer(service)
+
+    def start_span(self, name, **attrs):
+        span = self._tracer.start_span(
+            name, attributes={k: v for k, v in attrs.items() if v is not None}
+        )
+        token = self._context.attach(self._trace.set_span_in_context(span))
+        return _OtelSpan(span, token)
+
+    def end_span(self, span, error=None):
+        if error is not None:
+            span.span.record_exception(error)
+            span.span.set_status(self._trace.Status(self._trace.StatusCode.ERROR))
+        try:
+            self._context.detach(span.token)
+        except ValueError:
+            pass  # ended from another context (see JsonLinesTracer.end_span)
+        span.span.end()
+
+def make_tracer(exporter, path=None, min_ms=0.0, service='app', max_spans=MAX_SPANS):
+    if exporter == 'off':
+        return Tracer()
+    if exporter == 'otel':
+        return OpenTelemetryTracer(service)
+    if exporter == 'file':
+        return JsonLinesTracer(path, min_ms, max_spans)
+    raise ValueError(f"Unknown trace exporter {exporter!r}; use file, otel or off.")
@@ -0,0 +1,22 @@
+"""Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app     # Linux: forked workers x threads
+    python wsgi.py                            # waitress: one process, a thread pool (Windows too)
+"""
+import os
+
+from app import prepare_app
+
+app = prepare_app()
+
+if __name__ == '__main__':
+    from waitress import serve
+
+    serve(
+        app,
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", 5050)),
+        threads=int(os.environ.get("WAITRESS_THREADS", 8)),
+        connection_limit=int(os.environ.get("WAITRESS_CONNECTION_LIMIT", 200)),
+        channel_timeout=int(os.environ.get("WAITRESS_CHANNEL_TIMEOUT", 30)),
+    )